@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# Replays terminal output through the output coalescing stage and compares
+# message counts and delivery time against passing writes through as-is,
+# with a consumer that pays a fixed cost per message, like an RPC hop.
+#
+# Usage: bench_coalesce.py [recording] [per message cost ms]
+#
+# The recording is a raw capture of cosmotop output, e.g. from
+# `script -q -c 'cosmotop' out.raw`. Without one, synthetic output made of
+# many small writes with periodic full redraws is used.
+#
+# A second scenario stalls the consumer while output that only ever updates
+# the screen in place, without full redraws, keeps arriving, and reports
+# the largest backlog it was sent in one frame and whether the screen it
+# ends up with matches the output.
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from coalesce import FULL_REDRAW, StreamStats, coalesce  # noqa: E402
+from terminal import TerminalScreen  # noqa: E402
+
+
+def synthetic_frames(frames=100, writes_per_frame=150, redraw_every=20):
+    random.seed(0)
+    result = [[b'\x1b[?1049h\x1b[?25l']]
+    for frame in range(frames):
+        writes = []
+        if redraw_every and frame % redraw_every == 0:
+            writes.append(FULL_REDRAW + b'\x1b[0;0f')
+        for _ in range(writes_per_frame):
+            row, col = random.randint(1, 50), random.randint(1, 200)
+            writes.append(f"\x1b[{row};{col}f\x1b[38;5;{random.randint(0, 255)}m{random.randint(0, 99999):5d}".encode())
+        result.append(writes)
+    return result
+
+
+def recorded_frames(path, chunk=64, writes_per_frame=100):
+    with open(path, 'rb') as f:
+        data = f.read()
+    writes = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+    return [writes[i:i + writes_per_frame] for i in range(0, len(writes), writes_per_frame)]
+
+
+async def replay(frames, frame_interval=0.01):
+    # a redraw is a burst of small writes, followed by a pause
+    for writes in frames:
+        for write in writes:
+            yield write
+        await asyncio.sleep(frame_interval)
+
+
+async def consume(stream, cost):
+    messages = 0
+    total = 0
+    start = time.perf_counter()
+    async for data in stream:
+        messages += 1
+        total += len(data)
+        await asyncio.sleep(cost)
+    return {
+        "messages": messages,
+        "bytes": total,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+async def stalled(frames, stall=1.0):
+    # the consumer stops reading for a while after the first frame, as a
+    # viewer on a congested link would
+    stats = StreamStats()
+    expected = TerminalScreen()
+    received = TerminalScreen()
+    for write in (write for frame in frames for write in frame):
+        expected.feed(write)
+
+    largest = 0
+    messages = 0
+    start = time.perf_counter()
+    async for data in coalesce(replay(frames, 0), stats=stats):
+        if messages == 0:
+            await asyncio.sleep(stall)
+        messages += 1
+        largest = max(largest, len(data))
+        received.feed(data)
+    return {
+        "messages": messages,
+        "largest_frame": largest,
+        "bytes_dropped": stats.bytes_dropped,
+        "seconds": time.perf_counter() - start,
+        "screen_matches": received.screen.display == expected.screen.display,
+    }
+
+
+async def main():
+    frames = recorded_frames(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1] != '-' else synthetic_frames()
+    writes = [write for frame in frames for write in frame]
+    cost = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.001
+
+    stats = StreamStats()
+    results = {
+        "writes": len(writes),
+        "bytes": sum(len(w) for w in writes),
+        "per_message_cost_ms": cost * 1000,
+        "passthrough": await consume(replay(frames), cost),
+        "coalesced": await consume(coalesce(replay(frames), stats=stats), cost),
+    }
+    results["coalesced"]["bytes_dropped"] = stats.bytes_dropped
+    results["message_reduction"] = results["passthrough"]["messages"] / max(1, results["coalesced"]["messages"])
+    results["speedup"] = results["passthrough"]["seconds"] / results["coalesced"]["seconds"]
+    results["stalled_without_redraws"] = await stalled(synthetic_frames(frames=300, redraw_every=0))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# Runs the resumable downloader against a local HTTP server and reports,
+# as JSON, whether each scenario ended with the right file and how many
+# bytes the server had to send for it: a plain download, resuming a
+# partial file with Range, a partial file whose ETag no longer matches
+# (If-Range), the same two against a server that only sends Last-Modified,
+# a partial file without any validator, which must not be resumed, a
+# partial file that is already complete (416), a connection dropped
+# mid-transfer and a checksum mismatch.
+#
+# Usage: bench_download.py [size in MiB]
+#
+# Exits with a non-zero status if any scenario fails.
+
+import asyncio
+import hashlib
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import download  # noqa: E402
+
+
+class Blob:
+    def __init__(self, size):
+        self.data = os.urandom(size)
+        self.etag = '"v1"'
+        self.last_modified = 'Sat, 17 Oct 2026 00:00:00 GMT'
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+        self.sent = 0
+        self.requests = []
+        # drop the connection after this many body bytes, once
+        self.drop_after = None
+
+
+def make_handler(blob):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            data = blob.data
+            start = 0
+            status = 200
+            range_header = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+            blob.requests.append({"range": range_header, "if_range": if_range})
+            if range_header and (if_range is None or if_range in (blob.etag, blob.last_modified)):
+                start = int(range_header.split('=')[1].split('-')[0])
+                if start >= len(data):
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{len(data)}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status = 206
+
+            body = data[start:]
+            self.send_response(status)
+            if blob.etag:
+                self.send_header('ETag', blob.etag)
+            self.send_header('Last-Modified', blob.last_modified)
+            self.send_header('Content-Length', str(len(body)))
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+            self.end_headers()
+
+            if blob.drop_after is not None:
+                body = body[:blob.drop_after]
+                blob.drop_after = None
+                self.close_connection = True
+            self.wfile.write(body)
+            blob.sent += len(body)
+
+    return Handler
+
+
+def write_partial(dest, url, data, etag, last_modified=None):
+    with open(dest + '.tmp', 'wb') as f:
+        f.write(data)
+    with open(dest + '.tmp.meta', 'w') as f:
+        json.dump({'url': url, 'etag': etag, 'last_modified': last_modified}, f)
+
+
+async def run_scenario(name, blob, url, dest, prepare=None, sha256=None, expect_error=None, expect_sent=None):
+    for path in (dest, dest + '.tmp', dest + '.tmp.meta'):
+        if os.path.exists(path):
+            os.remove(path)
+    blob.sent = 0
+    blob.requests = []
+    if prepare:
+        prepare()
+
+    start = time.perf_counter()
+    error = None
+    try:
+        await download.download(url, dest, sha256=sha256 or blob.sha256, retries=2)
+    except download.DownloadError as e:
+        error = e
+    seconds = time.perf_counter() - start
+
+    if expect_error:
+        ok = isinstance(error, expect_error) and not os.path.exists(dest) and not os.path.exists(dest + '.tmp')
+    else:
+        ok = error is None and download.sha256_file(dest) == blob.sha256
+    if expect_sent is not None:
+        ok = ok and blob.sent == expect_sent
+    return name, {
+        "ok": ok,
+        "error": str(error) if error else None,
+        "bytes_sent": blob.sent,
+        "requests": blob.requests,
+        "seconds": seconds,
+    }
+
+
+async def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 4 * 1024 * 1024
+    blob = Blob(size)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), make_handler(blob))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/cosmotop"
+    half = size // 2
+
+    def drop_midway():
+        blob.drop_after = half
+
+    def without_etag(prepare):
+        def run():
+            blob.etag = None
+            prepare()
+        return run
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dest = os.path.join(tmpdir, 'cosmotop')
+        scenarios = [
+            await run_scenario("full", blob, url, dest),
+            await run_scenario("resume", blob, url, dest,
+                               lambda: write_partial(dest, url, blob.data[:half], blob.etag), expect_sent=size - half),
+            await run_scenario("stale_etag", blob, url, dest,
+                               lambda: write_partial(dest, url, os.urandom(half), '"v0"'), expect_sent=size),
+            await run_scenario("no_validator", blob, url, dest,
+                               lambda: write_partial(dest, url, os.urandom(half), None), expect_sent=size),
+            await run_scenario("already_complete", blob, url, dest,
+                               lambda: write_partial(dest, url, blob.data, blob.etag)),
+            await run_scenario("dropped_connection", blob, url, dest, drop_midway),
+            await run_scenario("checksum_mismatch", blob, url, dest, sha256='0' * 64,
+                               expect_error=download.ChecksumError),
+            await run_scenario("resume_last_modified", blob, url, dest, without_etag(
+                lambda: write_partial(dest, url, blob.data[:half], None, blob.last_modified)), expect_sent=size - half),
+            await run_scenario("stale_last_modified", blob, url, dest, without_etag(
+                lambda: write_partial(dest, url, os.urandom(half), None, 'Fri, 16 Oct 2026 00:00:00 GMT')),
+                expect_sent=size),
+        ]
+    server.shutdown()
+
+    results = {"size": size, "scenarios": dict(scenarios)}
+    print(json.dumps(results, indent=2))
+    if not all(result["ok"] for _, result in scenarios):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Measures the cost of the per-node metrics sampler: reading and parsing
+# /proc, adding a sample to the multi-resolution history, and querying it.
+#
+# Usage: bench_metrics.py [samples]
+#
+# Sampling runs once per second in the plugin, so the CPU share it takes is
+# the time per sample divided by one second.
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from metrics import METRICS, RESOLUTIONS, MetricsHistory, ProcSampler  # noqa: E402
+
+
+def per_call(fn, n):
+    start = time.perf_counter()
+    cpu = time.process_time()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n, (time.process_time() - cpu) / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    sampler = ProcSampler()
+    if not sampler.available():
+        print("/proc is not available", file=sys.stderr)
+        sys.exit(1)
+
+    sampler.sample()
+    sample_wall, sample_cpu = per_call(lambda i: sampler.sample(), n)
+
+    # simulate a week of samples, one per second, to fill every resolution
+    history = MetricsHistory()
+    now = time.time()
+    values = [0.0] * len(METRICS)
+    samples = RESOLUTIONS[-1][0] * RESOLUTIONS[-1][1]
+    add_wall, add_cpu = per_call(lambda i: history.add(now - samples + i, values), samples)
+
+    queries = {}
+    for step, size in RESOLUTIONS:
+        start = time.perf_counter()
+        result = history.query(now - step * size / 2, now, step)
+        queries[f"{step}s"] = {
+            "samples": len(result["time"]),
+            "seconds": time.perf_counter() - start,
+        }
+
+    print(json.dumps({
+        "sample_us": sample_wall * 1e6,
+        "sample_cpu_us": sample_cpu * 1e6,
+        "add_us": add_wall * 1e6,
+        "add_cpu_us": add_cpu * 1e6,
+        "cpu_percent_at_1hz": (sample_cpu + add_cpu) * 100,
+        "history_bytes": history.nbytes(),
+        "query": queries,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+# Runs the plugin against an in-process stand-in for scrypted_sdk with a
+# simulated cluster, and reports startup, worker discovery, config
+# propagation and terminal stream throughput as JSON.
+#
+# Usage: bench_plugin.py [--workers N] [--latency-ms MS] [--fork-ms MS]
+#                        [--stream-seconds S] [--coalesce] [--shared]
+#
+# Nothing is downloaded: a stand-in cosmotop script is installed ahead of
+# time, and all plugin state lives in a temporary directory.
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fakesdk'))
+
+import scrypted_sdk  # noqa: E402
+
+
+FAKE_COSMOTOP = """#!/bin/sh
+case "$1" in
+--show-defaults)
+    printf '#? Config file for cosmotop\\ncolor_theme = "Default"\\nupdate_ms = 2000\\nproc_sorting = "cpu lazy"\\n'
+    ;;
+--show-themes)
+    printf 'System themes:\\n  Default\\n  TTY\\nBundled themes:\\n  dracula\\n  nord\\nUser themes:\\n'
+    ;;
+esac
+"""
+
+
+def prepare_volume(volume):
+    fs = os.path.join(volume, 'zip', 'unzipped', 'fs')
+    os.makedirs(fs)
+    shutil.copy(os.path.join(ROOT, 'fs', 'cosmotop.json'), fs)
+    os.environ['SCRYPTED_PLUGIN_VOLUME'] = volume
+    os.environ['HOME'] = os.path.join(volume, 'home')
+
+
+def install_fake_cosmotop(main):
+    version_dir = main.InstallStore(main.FILES_PATH, main.CACHEBUST_PATH).version_dir(main.DOWNLOAD_CACHE_BUST)
+    os.makedirs(version_dir, exist_ok=True)
+    exe = os.path.join(version_dir, 'cosmotop')
+    with open(exe, 'w') as f:
+        f.write(FAKE_COSMOTOP)
+    os.chmod(exe, 0o755)
+
+
+async def terminal_input():
+    yield json.dumps({"dim": {"cols": 200, "rows": 50}})
+    await asyncio.Event().wait()
+
+
+async def measure_stream(device, seconds):
+    start = time.perf_counter()
+    stream = await device.connectStream(terminal_input(), None)
+    connected = time.perf_counter()
+    messages = 0
+    total = 0
+    try:
+        async for data in stream:
+            messages += 1
+            total += len(data)
+            if time.perf_counter() - connected >= seconds:
+                break
+    finally:
+        await stream.aclose()
+    elapsed = time.perf_counter() - connected
+    return {
+        "connect_seconds": connected - start,
+        "messages": messages,
+        "bytes": total,
+        "messages_per_sec": messages / elapsed,
+        "bytes_per_sec": total / elapsed,
+    }
+
+
+async def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError()
+        await asyncio.sleep(0.01)
+
+
+async def run(args, main):
+    storage = scrypted_sdk.storages.setdefault(None, scrypted_sdk.Storage())
+    storage.setItem('native_executable', 'false')
+    storage.setItem('coalesce_output', 'true' if args.coalesce else 'false')
+    storage.setItem('shared_sessions', 'true' if args.shared else 'false')
+
+    start = time.perf_counter()
+    plugin = main.create_scrypted_plugin()
+    await plugin.discovered
+    discovered = time.perf_counter()
+    workers = await asyncio.gather(*plugin.cluster_worker_ready.values())
+    workers_ready = time.perf_counter()
+    await plugin.config.config_reconciled
+    await wait_for(lambda: len(plugin.diagnostics.current["nodes"]) == args.workers + 1, 30)
+    ready = time.perf_counter()
+
+    results = {
+        "workers": args.workers,
+        "rpc_latency_ms": args.latency_ms,
+        "fork_ms": args.fork_ms,
+        "coalesce": args.coalesce,
+        "shared_sessions": args.shared,
+        "startup": {
+            "discovered_seconds": discovered - start,
+            "workers_ready_seconds": workers_ready - start,
+            "all_nodes_ready_seconds": ready - start,
+            "phases": plugin.diagnostics.current["nodes"],
+        },
+        "discovery": {
+            "fan_out_seconds": workers_ready - discovered,
+            "workers": list(plugin.cluster_worker_timings.values()),
+        },
+    }
+
+    template = await plugin.config.get_config()
+    start = time.perf_counter()
+    await plugin.config.saveScript({"script": template + "\n# benchmark\n"})
+    results["propagation"] = {
+        "seconds": time.perf_counter() - start,
+        "nodes": plugin.config.propagation,
+    }
+
+    results["stream"] = {
+        "server": await measure_stream(await scrypted_sdk.sdk.connectRPCObject(plugin), args.stream_seconds),
+    }
+    if workers:
+        results["stream"]["worker"] = await measure_stream(workers[0], args.stream_seconds)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    parser.add_argument('--fork-ms', type=float, default=200.0)
+    parser.add_argument('--stream-seconds', type=float, default=2.0)
+    parser.add_argument('--coalesce', action='store_true')
+    parser.add_argument('--shared', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as volume:
+        prepare_volume(volume)
+        import main as plugin_main
+        install_fake_cosmotop(plugin_main)
+        scrypted_sdk.configure(
+            workers=args.workers,
+            rpc_latency=args.latency_ms / 1000,
+            fork_delay=args.fork_ms / 1000,
+            main=plugin_main.fork,
+        )
+        results = asyncio.run(run(args, plugin_main))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+# Compares the CPU and memory cost of turning cosmotop into a camera feed
+# with the headless snapshot renderer against the X11 approach of
+# @scrypted/x11-camera: a virtual X display running a terminal emulator,
+# captured and encoded by ffmpeg.
+#
+# Usage: bench_snapshot.py [--cmd 'cosmotop ...'] [--seconds S] [--fps N]
+#                          [--format jpeg|png] [--x11]
+#
+# Both sides run the same command in a terminal of the same size for the
+# same time, and report the CPU share and peak resident memory of every
+# process involved, including the command itself. Without --cmd, synthetic
+# cosmotop-like output is rendered and the X11 side is skipped. --x11 needs
+# Xvfb, xterm and ffmpeg on the PATH.
+
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import pty
+import shlex
+import shutil
+import struct
+import subprocess
+import sys
+import termios
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from snapshot import TerminalSnapshots  # noqa: E402
+
+COLS = 160
+ROWS = 48
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def process_usage(pid):
+    """
+    Returns the CPU seconds and resident bytes of a process, or None if it
+    is gone.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            resident = int(f.read().split()[1])
+    except (OSError, IndexError):
+        return None
+    # utime and stime are the 14th and 15th fields, counted from the pid
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, resident * os.sysconf('SC_PAGE_SIZE')
+
+
+def descendants(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children + [grandchild for child in children for grandchild in descendants(child)]
+
+
+class UsageMonitor:
+    """
+    Samples the CPU time and resident memory of a set of process trees.
+    """
+
+    def __init__(self, roots):
+        self.roots = roots
+        self.cpu = {}
+        self.start_cpu = None
+        self.peak_rss = 0
+
+    def sample(self):
+        rss = 0
+        for pid in set(self.roots + [child for root in self.roots for child in descendants(root)]):
+            usage = process_usage(pid)
+            if usage is None:
+                continue
+            self.cpu[pid] = usage[0]
+            rss += usage[1]
+        self.peak_rss = max(self.peak_rss, rss)
+        if self.start_cpu is None:
+            self.start_cpu = dict(self.cpu)
+
+    async def run(self, seconds, interval=0.5):
+        self.sample()
+        start = time.monotonic()
+        while time.monotonic() - start < seconds:
+            await asyncio.sleep(interval)
+            self.sample()
+        elapsed = time.monotonic() - start
+        used = sum(cpu - self.start_cpu.get(pid, 0) for pid, cpu in self.cpu.items())
+        return {
+            "cpu_percent": 100 * used / elapsed,
+            "peak_rss_mb": self.peak_rss / 1024 ** 2,
+        }
+
+
+def pty_opener(cmd, children):
+    async def open_stream(input):
+        loop = asyncio.get_running_loop()
+        master, slave = pty.openpty()
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('HHHH', ROWS, COLS, 0, 0))
+        child = subprocess.Popen(cmd, stdin=slave, stdout=slave, stderr=slave, start_new_session=True,
+                                 env={**os.environ, 'TERM': 'xterm-256color'})
+        os.close(slave)
+        children.append(child)
+        queue = asyncio.Queue()
+
+        def readable():
+            try:
+                data = os.read(master, 65536)
+            except OSError:
+                data = b''
+            queue.put_nowait(data)
+            if not data:
+                loop.remove_reader(master)
+
+        loop.add_reader(master, readable)
+
+        async def output():
+            try:
+                while True:
+                    data = await queue.get()
+                    if not data:
+                        return
+                    yield data
+            finally:
+                loop.remove_reader(master)
+                child.terminate()
+                os.close(master)
+        return output()
+    return open_stream
+
+
+async def synthetic_stream(input):
+    async def output():
+        yield b'\x1b[?1049h\x1b[?25l\x1b[2J'
+        frame = 0
+        while True:
+            for i in range(150):
+                yield f"\x1b[{i % ROWS + 1};{(i * 7) % (COLS - 8) + 1}f\x1b[38;5;{i % 256}m{time.monotonic_ns() % 100000:5d}⣿".encode()
+            frame += 1
+            await asyncio.sleep(0.05)
+    return output()
+
+
+async def bench_headless(cmd, seconds, fps, format):
+    children = []
+    snapshots = TerminalSnapshots(pty_opener(cmd, children) if cmd else synthetic_stream, COLS, ROWS, fps, format)
+    first = time.perf_counter()
+    await snapshots.picture()
+    first = time.perf_counter() - first
+
+    monitor = UsageMonitor([os.getpid()])
+    sizes = []
+    render_times = []
+
+    async def poll():
+        # an NVR wall polls snapshots; poll at twice the frame rate so that
+        # rate limiting and unchanged frames show up in the counts
+        while True:
+            start = time.perf_counter()
+            rendered = snapshots.rendered
+            sizes.append(len(await snapshots.picture()))
+            if snapshots.rendered != rendered:
+                render_times.append(time.perf_counter() - start)
+            await asyncio.sleep(1 / fps / 2)
+
+    poller = asyncio.create_task(poll())
+    usage = await monitor.run(seconds)
+    poller.cancel()
+    snapshots.close()
+    for child in children:
+        child.terminate()
+        child.wait()
+
+    return {
+        **usage,
+        "first_picture_ms": first * 1000,
+        "rendered": snapshots.rendered,
+        "skipped": snapshots.skipped,
+        "mean_render_ms": 1000 * sum(render_times) / len(render_times) if render_times else None,
+        "mean_picture_bytes": sum(sizes) / len(sizes) if sizes else None,
+        "picture_size": snapshots.picture_size(),
+    }
+
+
+async def bench_x11(cmd, seconds, fps, size):
+    missing = [tool for tool in ('Xvfb', 'xterm', 'ffmpeg') if not shutil.which(tool)]
+    if missing:
+        return {"error": f"missing {', '.join(missing)}"}
+
+    display = ':87'
+    width, height = size
+    processes = [subprocess.Popen(['Xvfb', display, '-screen', '0', f'{width}x{height}x24'],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)]
+    try:
+        await asyncio.sleep(1)
+        env = {**os.environ, 'DISPLAY': display}
+        processes.append(subprocess.Popen(['xterm', '-geometry', f'{COLS}x{ROWS}+0+0', '-e', *cmd], env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        # what x11-camera does for a stream, encoding to nowhere
+        processes.append(subprocess.Popen([
+            'ffmpeg', '-loglevel', 'error', '-f', 'x11grab', '-framerate', str(fps), '-video_size', f'{width}x{height}',
+            '-i', display, '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency', '-f', 'null', '-',
+        ], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        await asyncio.sleep(1)
+        return await UsageMonitor([process.pid for process in processes]).run(seconds)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cmd', help="command to run in the terminal, such as 'cosmotop'")
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--fps', type=float, default=1)
+    parser.add_argument('--format', default='jpeg', choices=['jpeg', 'png'])
+    parser.add_argument('--x11', action='store_true', help="also measure Xvfb, xterm and ffmpeg")
+    args = parser.parse_args()
+
+    cmd = shlex.split(args.cmd) if args.cmd else None
+    results = {
+        "cols": COLS,
+        "rows": ROWS,
+        "fps": args.fps,
+        "seconds": args.seconds,
+        "command": args.cmd or "synthetic",
+    }
+    results["headless"] = await bench_headless(cmd, args.seconds, args.fps, args.format)
+    if args.x11:
+        if cmd:
+            results["x11"] = await bench_x11(cmd, args.seconds, args.fps, results["headless"]["picture_size"])
+        else:
+            results["x11"] = {"error": "needs --cmd"}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
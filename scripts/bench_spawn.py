@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# Compares cold and warm spawn times of the cosmotop APE binary against the
+# native executable assimilated from it.
+#
+# Usage: bench_spawn.py <path to cosmotop> [runs] [cosmotop args...]
+
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import native  # noqa: E402
+
+
+async def spawn(cmd):
+    start = time.perf_counter()
+    child = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    await child.wait()
+    return time.perf_counter() - start
+
+
+async def measure(cmd, runs):
+    # the first launch of a freshly written file is the cold one
+    cold = await spawn(cmd)
+    warm = [await spawn(cmd) for _ in range(runs)]
+    return {
+        "cold_ms": cold * 1000,
+        "warm_mean_ms": statistics.mean(warm) * 1000,
+        "warm_min_ms": min(warm) * 1000,
+        "warm_max_ms": max(warm) * 1000,
+    }
+
+
+async def main():
+    if len(sys.argv) < 2:
+        print("Usage: bench_spawn.py <path to cosmotop> [runs] [cosmotop args...]", file=sys.stderr)
+        sys.exit(1)
+
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    args = sys.argv[3:] or ['--version']
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        exe = os.path.join(tmpdir, 'cosmotop')
+        shutil.copyfile(sys.argv[1], exe)
+        os.chmod(exe, 0o755)
+
+        results = {"runs": runs, "args": args}
+        results["ape"] = await measure(native.command(exe, None, *args), runs)
+
+        start = time.perf_counter()
+        native_exe = await native.assimilate(exe)
+        results["assimilate_ms"] = (time.perf_counter() - start) * 1000
+        results["native"] = await measure(native.command(exe, native_exe, *args), runs)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
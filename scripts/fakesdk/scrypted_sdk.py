@@ -0,0 +1,319 @@
+# In-process stand-in for scrypted_sdk, used by the benchmark harness to run
+# the plugin without a Scrypted server.
+#
+# Every object handed across a simulated RPC boundary (connectRPCObject,
+# fork results and the arguments passed to their methods) is wrapped in a
+# proxy that delays each call by the configured latency in both directions.
+# Async generators are forwarded with the same latency per message, without
+# limiting throughput.
+
+import asyncio
+import enum
+import inspect
+import json
+import os
+import sys
+import time
+from typing import Any, AsyncGenerator, Callable
+
+
+latency = 0.0
+fork_startup = 0.0
+fork_main: Callable = None
+verbose = bool(os.environ.get('FAKESDK_VERBOSE'))
+
+
+class ScryptedDeviceType(enum.Enum):
+    API = "API"
+    Builtin = "Builtin"
+
+
+class ScryptedInterface(enum.Enum):
+    Camera = "Camera"
+    DeviceProvider = "DeviceProvider"
+    Readme = "Readme"
+    Scriptable = "Scriptable"
+    Settings = "Settings"
+    StreamService = "StreamService"
+    TTY = "TTY"
+    TTYSettings = "TTYSettings"
+
+
+Setting = dict
+ScriptSource = dict
+
+
+class Camera:
+    pass
+
+
+class DeviceProvider:
+    pass
+
+
+class Readme:
+    pass
+
+
+class Scriptable:
+    pass
+
+
+class Settings:
+    pass
+
+
+class StreamService:
+    pass
+
+
+class TTYSettings:
+    pass
+
+
+class Storage:
+    def __init__(self) -> None:
+        self.items = {}
+
+    def getItem(self, key: str) -> str | None:
+        return self.items.get(key)
+
+    def setItem(self, key: str, value: str) -> None:
+        self.items[key] = value
+
+    def removeItem(self, key: str) -> None:
+        self.items.pop(key, None)
+
+
+# device storage by native id, shared by the server and its simulated workers
+storages: dict[str, Storage] = {}
+
+
+class ScryptedDeviceBase:
+    def __init__(self, nativeId: str = None) -> None:
+        self.nativeId = nativeId
+        self.storage = storages.setdefault(nativeId, Storage())
+        self.events = 0
+
+    def print(self, *args, **kwargs) -> None:
+        if verbose:
+            print(f"[{self.nativeId}]", *args, file=sys.stderr, **kwargs)
+
+    async def onDeviceEvent(self, interface: str, value: Any) -> None:
+        self.events += 1
+
+
+PASSTHROUGH = (str, bytes, bytearray, int, float, bool, type(None), dict, list, tuple, enum.Enum)
+
+
+def wrap(value: Any) -> Any:
+    """
+    Wraps a value crossing the simulated RPC boundary.
+    """
+    if isinstance(value, (RpcProxy, PASSTHROUGH)):
+        return value
+    if inspect.isasyncgen(value):
+        return delayed(value)
+    return RpcProxy(value)
+
+
+async def delayed(stream: AsyncGenerator[Any, None]) -> AsyncGenerator[Any, None]:
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for message in stream:
+                queue.put_nowait((loop.time() + latency, message))
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                break
+            due, message = entry
+            if due > loop.time():
+                await asyncio.sleep(due - loop.time())
+            yield message
+        await task
+    finally:
+        task.cancel()
+
+
+class RpcProxy:
+    def __init__(self, target: Any) -> None:
+        self._target = target
+        self.calls = 0
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            self.calls += 1
+            await asyncio.sleep(latency)
+            result = attr(*[wrap(arg) for arg in args], **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            await asyncio.sleep(latency)
+            return wrap(result)
+        return call
+
+
+class Sdk:
+    async def connectRPCObject(self, value: Any) -> Any:
+        return wrap(value)
+
+
+class Worker:
+    def terminate(self) -> None:
+        pass
+
+
+class PluginFork:
+    def __init__(self) -> None:
+        self.worker = Worker()
+        self.result = asyncio.ensure_future(self.start())
+
+    async def start(self) -> Any:
+        await asyncio.sleep(fork_startup)
+        return wrap(await fork_main())
+
+
+def fork(options: dict = None) -> PluginFork:
+    return PluginFork()
+
+
+class TerminalService:
+    """
+    Simulated terminal output in the shape of cosmotop redraws: bursts of
+    small writes, with a full redraw every few frames.
+    """
+
+    def __init__(self) -> None:
+        self.frame_interval = 0.05
+        self.writes_per_frame = 150
+        self.sessions = 0
+
+    async def forkInterface(self, interface: str, options: dict) -> Any:
+        await asyncio.sleep(fork_startup)
+        return wrap(self)
+
+    async def connectStream(self, input: AsyncGenerator[Any, None] = None, options: Any = None) -> AsyncGenerator[bytes, None]:
+        self.sessions += 1
+        closed = asyncio.Event()
+
+        async def read_input():
+            async for message in input:
+                if isinstance(message, str) and 'eof' in json.loads(message):
+                    break
+            closed.set()
+
+        async def output():
+            reader = asyncio.create_task(read_input()) if input is not None else None
+            try:
+                yield b'\x1b[?1049h\x1b[?25l'
+                frame = 0
+                while not closed.is_set():
+                    if frame % 20 == 0:
+                        yield b'\x1b[2J\x1b[0;0f'
+                    for i in range(self.writes_per_frame):
+                        yield f"\x1b[{i % 50 + 1};{(i * 7) % 200 + 1}f\x1b[38;5;{i % 256}m{time.monotonic_ns() % 100000:5d}".encode()
+                    frame += 1
+                    await asyncio.sleep(self.frame_interval)
+            finally:
+                if reader:
+                    reader.cancel()
+
+        return output()
+
+
+class Core:
+    def __init__(self) -> None:
+        self.terminalservice = TerminalService()
+
+    async def getDevice(self, nativeId: str) -> Any:
+        return self.terminalservice
+
+
+class Logger:
+    async def log(self, level: str, message: str) -> None:
+        pass
+
+
+class Api:
+    async def getLogger(self, nativeId: str) -> Logger:
+        return Logger()
+
+
+class SystemManager:
+    def __init__(self) -> None:
+        self.core = Core()
+        self.api = Api()
+
+    def getDeviceByName(self, name: str) -> Any:
+        if name == "@scrypted/core":
+            return self.core
+        return None
+
+
+class MediaObject:
+    def __init__(self, data: Any, mimeType: str) -> None:
+        self.data = data
+        self.mimeType = mimeType
+
+
+class MediaManager:
+    async def createMediaObject(self, data: Any, mimeType: str) -> MediaObject:
+        return MediaObject(data, mimeType)
+
+
+class DeviceManager:
+    def __init__(self) -> None:
+        self.devices = {}
+        self.restarts = 0
+
+    async def onDevicesChanged(self, devices: dict) -> None:
+        self.devices = {device['nativeId']: device for device in devices['devices']}
+
+    async def onDeviceDiscovered(self, device: dict) -> None:
+        self.devices[device['nativeId']] = device
+
+    async def onDeviceRemoved(self, nativeId: str) -> None:
+        self.devices.pop(nativeId, None)
+
+    async def requestRestart(self) -> None:
+        self.restarts += 1
+
+
+class ClusterManager:
+    def __init__(self, workers: int) -> None:
+        self.workers = {'server': {'mode': 'server', 'name': 'server'}}
+        for i in range(workers):
+            self.workers[f'worker-{i}'] = {'mode': 'client', 'name': f'worker-{i}'}
+
+    async def getClusterWorkers(self) -> dict:
+        await asyncio.sleep(latency * 2)
+        return dict(self.workers)
+
+
+sdk = Sdk()
+systemManager = SystemManager()
+deviceManager = DeviceManager()
+mediaManager = MediaManager()
+clusterManager: ClusterManager = None
+
+
+def configure(workers: int = 0, rpc_latency: float = 0.0, fork_delay: float = 0.0, main: Callable = None) -> None:
+    """
+    Sets up the simulated cluster. Must be called before the plugin is created.
+    """
+    global latency, fork_startup, fork_main, clusterManager
+    latency = rpc_latency
+    fork_startup = fork_delay
+    fork_main = main
+    clusterManager = ClusterManager(workers)
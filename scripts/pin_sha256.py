@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+# Downloads a cosmotop release and records its version and SHA-256 in
+# fs/cosmotop.json, which the plugin uses to verify the binary it downloads.
+#
+# Usage: pin_sha256.py [version]
+#
+# Without a version, the one already in fs/cosmotop.json is pinned.
+
+import hashlib
+import json
+import os
+import sys
+import urllib.request
+
+COSMOTOP_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fs', 'cosmotop.json')
+
+
+def main():
+    with open(COSMOTOP_JSON) as f:
+        info = json.load(f)
+    version = sys.argv[1] if len(sys.argv) > 1 else info['version']
+
+    url = f"https://github.com/bjia56/cosmotop/releases/download/{version}/cosmotop"
+    h = hashlib.sha256()
+    with urllib.request.urlopen(url, timeout=60) as response:
+        while True:
+            data = response.read(1024 * 1024)
+            if not data:
+                break
+            h.update(data)
+
+    info['version'] = version
+    info['sha256'] = h.hexdigest()
+    with open(COSMOTOP_JSON, 'w') as f:
+        json.dump(info, f, indent=4)
+    print(f"{version} {info['sha256']}")
+
+
+if __name__ == "__main__":
+    main()
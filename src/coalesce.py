@@ -0,0 +1,164 @@
+import asyncio
+import re
+import time
+from typing import Any, AsyncGenerator
+
+from terminal import TerminalScreen
+
+
+# cosmotop starts every full redraw by clearing the screen
+FULL_REDRAW = b'\x1b[2J'
+# private mode changes, such as the alternate screen or mouse tracking,
+# that must survive when the output before a full redraw is dropped
+PRIVATE_MODE = re.compile(rb'\x1b\[\?[0-9;]*[hl]')
+
+
+class StreamStats:
+    """
+    Byte and message counters for terminal streams, with per-second rates
+    computed over the interval since the previous rates() call.
+    """
+
+    def __init__(self) -> None:
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_dropped = 0
+        self.last = (time.monotonic(), 0, 0, 0, 0)
+
+    def rates(self) -> dict:
+        now = time.monotonic()
+        then, bytes_in, bytes_out, messages_in, messages_out = self.last
+        elapsed = max(now - then, 1e-6)
+        self.last = (now, self.bytes_in, self.bytes_out, self.messages_in, self.messages_out)
+        return {
+            "bytes_in_per_sec": (self.bytes_in - bytes_in) / elapsed,
+            "bytes_out_per_sec": (self.bytes_out - bytes_out) / elapsed,
+            "messages_in_per_sec": (self.messages_in - messages_in) / elapsed,
+            "messages_out_per_sec": (self.messages_out - messages_out) / elapsed,
+        }
+
+    def summary(self) -> str:
+        rates = self.rates()
+        return (
+            f"{self.messages_in} messages in, {self.messages_out} out, {self.bytes_dropped} bytes dropped; "
+            f"now {rates['messages_in_per_sec']:.0f} msg/s in, {rates['messages_out_per_sec']:.0f} msg/s out, "
+            f"{rates['bytes_out_per_sec'] / 1024:.1f} KiB/s out"
+        )
+
+
+def drop_before_redraw(backlog: bytes, index: int) -> tuple[bytes, int]:
+    """
+    Drops everything before the full redraw at index in backlog, keeping any
+    private mode changes from the dropped part. Returns the new backlog and
+    the number of bytes dropped.
+    """
+    if index <= 0:
+        return backlog, 0
+    modes = b''.join(PRIVATE_MODE.findall(backlog, 0, index))
+    return modes + backlog[index:], index - len(modes)
+
+
+async def coalesce(stream: AsyncGenerator[Any, None], interval: float = 0.02, max_bytes: int = 64 * 1024,
+                   max_backlog: int = 256 * 1024, stats: StreamStats = None,
+                   screen: TerminalScreen = None) -> AsyncGenerator[bytes, None]:
+    """
+    Batches a terminal output stream into frames.
+
+    A frame is sent once interval seconds have passed since its first byte
+    arrived, or as soon as it reaches max_bytes. While the consumer is busy,
+    output keeps accumulating; once more than max_backlog bytes are pending,
+    everything before the most recent full redraw is dropped, since that
+    redraw repaints the whole screen anyway. If there is no full redraw to
+    fall back on, the pending output is replaced by a snapshot of the screen
+    it would produce. To have that screen at hand, every frame that is sent
+    is also fed into screen.
+
+    :param stream: Terminal output stream.
+    :param interval: Maximum seconds to hold back output.
+    :param max_bytes: Frame size that is sent without waiting for interval.
+    :param max_backlog: Pending bytes above which intermediate redraws are dropped.
+    :param stats: Optional counters to update.
+    :param screen: Screen that mirrors what the consumer has been sent, sized
+        like the consumer's terminal, e.g. with session.follow_resizes().
+    """
+    stats = stats or StreamStats()
+    screen = screen or TerminalScreen()
+    backlog = bytearray()
+    # offset of the last full redraw in backlog, or -1
+    last_redraw = -1
+    # bytes at the start of backlog that screen already reflects
+    mirrored = 0
+    ready = asyncio.Event()
+    full = asyncio.Event()
+    done = False
+
+    async def read():
+        nonlocal backlog, done, last_redraw, mirrored
+        try:
+            async for message in stream:
+                data = message.encode() if isinstance(message, str) else message
+                stats.messages_in += 1
+                stats.bytes_in += len(data)
+                # only the new data, and a redraw sequence split across
+                # messages, needs searching
+                start = max(len(backlog) - len(FULL_REDRAW) + 1, 0)
+                backlog += data
+                index = backlog.rfind(FULL_REDRAW, start)
+                if index >= 0:
+                    last_redraw = index
+                if len(backlog) > max_backlog and last_redraw > 0:
+                    trimmed, dropped = drop_before_redraw(backlog, last_redraw)
+                    backlog = bytearray(trimmed)
+                    stats.bytes_dropped += dropped
+                    last_redraw = -1
+                    # the redraw starts over from a blank screen
+                    mirrored = 0
+                elif len(backlog) - mirrored > max_backlog:
+                    screen.feed(bytes(backlog[mirrored:]))
+                    snapshot = screen.snapshot()
+                    if len(snapshot) < len(backlog):
+                        stats.bytes_dropped += len(backlog) - len(snapshot)
+                        backlog = bytearray(snapshot)
+                        last_redraw = -1
+                    mirrored = len(backlog)
+                ready.set()
+                if len(backlog) >= max_bytes:
+                    full.set()
+        finally:
+            done = True
+            ready.set()
+            full.set()
+
+    reader = asyncio.create_task(read())
+    try:
+        while True:
+            if not done:
+                await ready.wait()
+            if not done and len(backlog) < max_bytes:
+                try:
+                    await asyncio.wait_for(full.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            frame = bytes(backlog)
+            backlog.clear()
+            if len(frame) > mirrored:
+                screen.feed(frame[mirrored:])
+            last_redraw = -1
+            mirrored = 0
+            ready.clear()
+            full.clear()
+
+            if frame:
+                stats.messages_out += 1
+                stats.bytes_out += len(frame)
+                yield frame
+            elif done:
+                break
+
+        # surface errors from the underlying stream
+        await reader
+    finally:
+        reader.cancel()
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import http.client
+import json
+import os
+import time
+from typing import Any, Callable
+import urllib.error
+import urllib.request
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ChecksumError(DownloadError):
+    pass
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(CHUNK_SIZE)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+class ProgressThrottle:
+    """
+    Rate limits progress reports so that a download logs a handful of lines
+    instead of one line per chunk.
+
+    :param report: Called with (bytes read, total bytes or None).
+    :param interval: Minimum number of seconds between reports.
+    """
+
+    def __init__(self, report: Callable[[int, int | None], None], interval: float = 2.0) -> None:
+        self.report = report
+        self.interval = interval
+        self.last = 0.0
+
+    def update(self, read: int, total: int | None, force: bool = False) -> None:
+        now = time.monotonic()
+        if force or now - self.last >= self.interval:
+            self.last = now
+            self.report(read, total)
+
+
+def format_progress(url: str, read: int, total: int | None) -> str:
+    if total:
+        return f"Downloaded {read} of {total} bytes ({100 * read // total}%) from {url}"
+    return f"Downloaded {read} bytes from {url}"
+
+
+def _load_meta(meta_path: str) -> dict:
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_meta(meta_path: str, meta: dict) -> None:
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+
+def _download_sync(url: str, dest: str, sha256: str | None, progress: ProgressThrottle | None, timeout: float) -> str:
+    tmp = dest + '.tmp'
+    meta_path = tmp + '.meta'
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    # A partial download is only resumed if it came from the same URL and
+    # the server gave a validator for it, otherwise it may belong to a
+    # different release and the two halves would be concatenated.
+    meta = _load_meta(meta_path)
+    offset = os.path.getsize(tmp) if os.path.isfile(tmp) else 0
+    validator = meta.get('etag') or meta.get('last_modified')
+    if offset and (meta.get('url') != url or not validator):
+        offset = 0
+
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header('Range', f'bytes={offset}-')
+        request.add_header('If-Range', validator)
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            # the partial file may already be complete
+            if sha256 is None or sha256_file(tmp) == sha256.lower():
+                os.replace(tmp, dest)
+                _remove(meta_path)
+                return dest
+            _remove(tmp)
+            _remove(meta_path)
+            return _download_sync(url, dest, sha256, progress, timeout)
+        raise DownloadError(f"Error downloading {url}: HTTP {e.code}") from e
+
+    with response:
+        code = response.getcode()
+        if code == 206 and offset:
+            content_range = response.headers.get('Content-Range', '')
+            if not content_range.startswith(f'bytes {offset}-'):
+                raise DownloadError(f"Unexpected Content-Range {content_range!r} from {url}")
+            mode = 'ab'
+        elif code is not None and 200 <= code < 300:
+            offset = 0
+            mode = 'wb'
+        else:
+            raise DownloadError(f"Error downloading {url}: HTTP {code}")
+
+        length = response.headers.get('Content-Length')
+        total = offset + int(length) if length is not None else None
+
+        _save_meta(meta_path, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        })
+
+        h = hashlib.sha256()
+        if offset:
+            with open(tmp, 'rb') as f:
+                while True:
+                    data = f.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    h.update(data)
+
+        read = offset
+        with open(tmp, mode) as f:
+            while True:
+                data = response.read(CHUNK_SIZE)
+                if not data:
+                    break
+                h.update(data)
+                f.write(data)
+                read += len(data)
+                if progress:
+                    progress.update(read, total)
+
+        if progress:
+            progress.update(read, total, force=True)
+
+    if total is not None and read != total:
+        raise DownloadError(f"Incomplete download of {url}: {read} of {total} bytes")
+
+    digest = h.hexdigest()
+    if sha256 is not None and digest != sha256.lower():
+        _remove(tmp)
+        _remove(meta_path)
+        raise ChecksumError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+
+    os.replace(tmp, dest)
+    _remove(meta_path)
+    return dest
+
+
+def _fetch_sync(url: str, dest: str, etag: str | None, last_modified: str | None, timeout: float) -> dict | None:
+    request = urllib.request.Request(url)
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if last_modified:
+        request.add_header('If-Modified-Since', last_modified)
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise DownloadError(f"Error downloading {url}: HTTP {e.code}") from e
+
+    tmp = dest + '.tmp'
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with response:
+        code = response.getcode()
+        if code == 304:
+            return None
+        if code is not None and not 200 <= code < 300:
+            raise DownloadError(f"Error downloading {url}: HTTP {code}")
+
+        h = hashlib.sha256()
+        size = 0
+        with open(tmp, 'wb') as f:
+            while True:
+                data = response.read(CHUNK_SIZE)
+                if not data:
+                    break
+                h.update(data)
+                f.write(data)
+                size += len(data)
+
+        length = response.headers.get('Content-Length')
+        if length is not None and size != int(length):
+            _remove(tmp)
+            raise DownloadError(f"Incomplete download of {url}: {size} of {length} bytes")
+
+        result = {
+            'sha256': h.hexdigest(),
+            'size': size,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
+    os.replace(tmp, dest)
+    return result
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def download(url: str, dest: str, sha256: str | None = None, report: Callable[[int, int | None], None] = None,
+                   report_interval: float = 2.0, retries: int = 3, timeout: float = 30) -> str:
+    """
+    Downloads url to dest without blocking the event loop.
+
+    The response is streamed in a worker thread into dest + '.tmp'. If a
+    partial file from an earlier attempt exists, the download resumes from
+    its end with an HTTP Range request, conditional on the ETag or
+    Last-Modified of the earlier response. Connection errors are retried with
+    backoff, each retry resuming where the last one stopped.
+
+    :param url: URL to download.
+    :param dest: Final path of the file, only created once the download is complete and verified.
+    :param sha256: Expected hex SHA-256 of the file. Verification is skipped if None.
+    :param report: Called on the event loop with (bytes read, total bytes or None) at most every report_interval seconds.
+    :param retries: Number of retries after the first attempt. Checksum mismatches are not retried.
+    :param timeout: Socket timeout in seconds.
+    """
+    loop = asyncio.get_running_loop()
+    progress = None
+    if report:
+        progress = ProgressThrottle(lambda read, total: loop.call_soon_threadsafe(report, read, total), report_interval)
+
+    return await _with_retries(retries, _download_sync, url, dest, sha256, progress, timeout)
+
+
+async def fetch(url: str, dest: str, etag: str | None = None, last_modified: str | None = None,
+                retries: int = 3, timeout: float = 30) -> dict | None:
+    """
+    Downloads url to dest unless it is unchanged since an earlier download,
+    without blocking the event loop.
+
+    The request is made conditional on the validators from the earlier
+    download, if given. Returns None if the server reports the resource as
+    not modified, in which case dest is left untouched. Otherwise returns
+    the sha256, size, etag and last_modified of the new file.
+
+    :param url: URL to download.
+    :param dest: Path of the file, replaced once the download is complete.
+    :param etag: ETag returned by the earlier download.
+    :param last_modified: Last-Modified returned by the earlier download.
+    :param retries: Number of retries after the first attempt.
+    :param timeout: Socket timeout in seconds.
+    """
+    return await _with_retries(retries, _fetch_sync, url, dest, etag, last_modified, timeout)
+
+
+async def _with_retries(retries: int, fn: Callable, *args) -> Any:
+    attempt = 0
+    while True:
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except ChecksumError:
+            raise
+        except (DownloadError, OSError, http.client.HTTPException) as e:
+            if isinstance(e, DownloadError) and isinstance(e.__cause__, urllib.error.HTTPError) and e.__cause__.code < 500:
+                raise
+            if attempt >= retries:
+                raise
+            attempt += 1
+            await asyncio.sleep(min(2 ** attempt, 30))
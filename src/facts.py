@@ -0,0 +1,61 @@
+import glob
+import os
+import platform
+import time
+
+
+# sysfs and procfs paths whose presence means cosmotop can monitor a GPU or
+# NPU on this node, as described in the README
+GPU_PATHS = ['/sys/class/drm/card[0-9]*', '/proc/driver/nvidia/gpus/*']
+NPU_PATHS = ['/sys/devices/pci0000:00/0000:00:0b.0', '/sys/class/accel/accel[0-9]*', '/sys/kernel/debug/rknpu']
+
+
+def memory_bytes() -> int | None:
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def any_path(patterns: list[str]) -> bool:
+    return any(glob.glob(pattern) for pattern in patterns)
+
+
+def collect() -> dict:
+    """
+    Gathers facts about the node this runs on.
+    """
+    system = platform.system()
+    machine = platform.machine()
+    memory = memory_bytes()
+    apple_silicon = system == 'Darwin' and machine == 'arm64'
+    return {
+        "cpu_count": os.cpu_count() or 1,
+        "memory_bytes": memory,
+        "memory_gb": round(memory / 1024 ** 3, 1) if memory else None,
+        "arch": machine,
+        "os": system,
+        "gpu": apple_silicon or (system == 'Linux' and any_path(GPU_PATHS)),
+        "npu": apple_silicon or (system == 'Linux' and any_path(NPU_PATHS)),
+    }
+
+
+class NodeFacts:
+    """
+    Facts about the node, such as CPU count and memory, collected on first
+    use and again once they are older than ttl seconds.
+
+    :param ttl: Seconds to keep collected facts.
+    """
+
+    def __init__(self, ttl: float = 300) -> None:
+        self.ttl = ttl
+        self.facts = None
+        self.collected = 0.0
+
+    def get(self) -> dict:
+        now = time.monotonic()
+        if self.facts is None or now - self.collected > self.ttl:
+            self.facts = collect()
+            self.collected = now
+        return self.facts
@@ -0,0 +1,123 @@
+import collections
+import re
+import time
+
+
+# cosmotop log lines look like "2025/01/01 (12:00:00) | ERROR: message"
+LEVEL_PATTERN = re.compile(r'\| (ERROR|WARNING|INFO|DEBUG):')
+LEVELS = ['ERROR', 'WARNING', 'INFO', 'DEBUG']
+
+
+def parse_level(line: str) -> str:
+    match = LEVEL_PATTERN.search(line)
+    return match.group(1) if match else 'INFO'
+
+
+def to_records(lines: list[str]) -> list[list]:
+    """
+    Converts raw log lines into compact [timestamp, level, text] records.
+    """
+    now = time.time()
+    return [[now, parse_level(line), line.rstrip('\n')] for line in lines]
+
+
+class LogRing:
+    """
+    Size-bounded ring buffer of log records from multiple nodes, with
+    indexes by node and by level.
+
+    Records are stored as tuples with node and level interned to small
+    integers. Once the total size of the stored text exceeds max_bytes, the
+    oldest records are evicted; index entries pointing at evicted records
+    are trimmed lazily. counts holds the number of buffered records per
+    node and level.
+
+    :param max_bytes: Maximum total size of stored log text.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.records = collections.deque()
+        self.size = 0
+        self.next_seq = 0
+        self.nodes: list[str] = []
+        self.node_ids: dict[str, int] = {}
+        self.by_node: dict[int, collections.deque] = {}
+        self.by_level: dict[int, collections.deque] = {i: collections.deque() for i in range(len(LEVELS))}
+        self.counts: dict[tuple[str, str], int] = collections.Counter()
+
+    def node_id(self, node: str) -> int:
+        if node not in self.node_ids:
+            self.node_ids[node] = len(self.nodes)
+            self.nodes.append(node)
+            self.by_node[self.node_ids[node]] = collections.deque()
+        return self.node_ids[node]
+
+    def add(self, node: str, records: list[list]) -> None:
+        node_id = self.node_id(node)
+        for timestamp, level, text in records:
+            level_id = LEVELS.index(level) if level in LEVELS else LEVELS.index('INFO')
+            seq = self.next_seq
+            self.next_seq += 1
+            self.records.append((seq, timestamp, node_id, level_id, text))
+            self.by_node[node_id].append(seq)
+            self.by_level[level_id].append(seq)
+            self.size += len(text)
+            self.counts[(node, LEVELS[level_id])] += 1
+
+        while self.size > self.max_bytes and self.records:
+            _, _, node_id, level_id, text = self.records.popleft()
+            self.size -= len(text)
+            self.counts[(self.nodes[node_id], LEVELS[level_id])] -= 1
+
+        first = self.records[0][0] if self.records else self.next_seq
+        for index in (*self.by_node.values(), *self.by_level.values()):
+            while index and index[0] < first:
+                index.popleft()
+
+    def get(self, seq: int) -> tuple:
+        return self.records[seq - self.records[0][0]]
+
+    def query(self, node: str = None, level: str = None, text: str = None, limit: int = 100) -> list[dict]:
+        """
+        Returns up to limit of the most recent records matching all given
+        filters, oldest first.
+        """
+        if not self.records or limit <= 0:
+            return []
+
+        node_id = self.node_ids.get(node) if node else None
+        level_id = LEVELS.index(level) if level in LEVELS else None
+        if node and node_id is None:
+            return []
+
+        # walk the smallest applicable index
+        candidates = [index for index in (
+            self.by_node.get(node_id) if node_id is not None else None,
+            self.by_level.get(level_id) if level_id is not None else None,
+        ) if index is not None]
+        if candidates:
+            seqs = reversed(min(candidates, key=len))
+            records = (self.get(seq) for seq in seqs)
+        else:
+            records = reversed(self.records)
+
+        needle = text.lower() if text else None
+        results = []
+        for seq, timestamp, rec_node, rec_level, rec_text in records:
+            if node_id is not None and rec_node != node_id:
+                continue
+            if level_id is not None and rec_level != level_id:
+                continue
+            if needle and needle not in rec_text.lower():
+                continue
+            results.append({
+                "timestamp": timestamp,
+                "node": self.nodes[rec_node],
+                "level": LEVELS[rec_level],
+                "text": rec_text,
+            })
+            if len(results) >= limit:
+                break
+        results.reverse()
+        return results
@@ -0,0 +1,212 @@
+import asyncio
+import collections
+import ctypes
+import ctypes.util
+import os
+import platform
+import struct
+from typing import AsyncGenerator
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+
+INOTIFY_EVENT = struct.Struct('iIII')
+READ_SIZE = 256 * 1024
+
+
+class Inotify:
+    """
+    Minimal inotify binding that watches a directory for changes to a
+    single file name.
+    """
+
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    def __init__(self, directory: str, filename: str) -> None:
+        self.filename = filename.encode()
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, directory.encode(), Inotify.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        self.watch_gone = False
+
+    def read(self) -> bool:
+        """
+        Drains pending events, returning whether any concerned the file.
+        """
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset + INOTIFY_EVENT.size <= len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+                offset += INOTIFY_EVENT.size + length
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    self.watch_gone = True
+                    relevant = True
+                elif name == self.filename:
+                    relevant = True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LogTailer:
+    """
+    Follows a log file like `tail -F`, yielding batches of complete lines.
+
+    On Linux, changes are picked up through inotify on the file's directory,
+    falling back to polling elsewhere or if inotify is unavailable. Rotation
+    is detected by a change of inode, in which case the rest of the old file
+    is read before switching, and truncation by the file shrinking below the
+    read position.
+
+    Lines are held in a bounded buffer between reads and batches; if the
+    consumer falls behind, the oldest lines are discarded and counted in
+    dropped.
+
+    :param path: Path of the file to follow.
+    :param poll_interval: Seconds between checks when polling, and between
+        safety checks when using inotify.
+    :param max_lines: Maximum number of buffered lines.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1, max_lines: int = 10000) -> None:
+        self.path = path
+        self.poll_interval = poll_interval
+        self.buffer = collections.deque(maxlen=max_lines)
+        self.dropped = 0
+        self.file = None
+        self.inode = None
+        self.partial = b''
+        self.available = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.inotify = None
+
+    def open(self, from_start: bool) -> None:
+        try:
+            self.file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        if not from_start:
+            self.file.seek(0, os.SEEK_END)
+
+    def close_file(self) -> None:
+        if self.file:
+            self.file.close()
+        self.file = None
+        self.inode = None
+        self.partial = b''
+
+    def read_available(self) -> None:
+        while True:
+            data = self.file.read(READ_SIZE)
+            if not data:
+                return
+            lines = (self.partial + data).split(b'\n')
+            self.partial = lines.pop()
+            for line in lines:
+                if len(self.buffer) == self.buffer.maxlen:
+                    self.dropped += 1
+                self.buffer.append(line.decode(errors='replace') + '\n')
+
+    def check(self, first: bool = False) -> None:
+        if self.file is None:
+            # only the file present when tailing starts is read from the end
+            self.open(from_start=not first)
+            if self.file is None:
+                return
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+
+        if st is not None and st.st_ino == self.inode and st.st_size < self.file.tell():
+            # truncated in place
+            self.file.seek(0)
+            self.partial = b''
+
+        self.read_available()
+
+        if st is None or st.st_ino != self.inode:
+            # rotated or removed, the rest of the old file has been read above
+            self.close_file()
+            if st is not None:
+                self.open(from_start=True)
+                self.read_available()
+
+        if self.buffer:
+            self.available.set()
+
+    def start_inotify(self) -> None:
+        if platform.system() != 'Linux' or self.inotify is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            return
+        try:
+            self.inotify = Inotify(directory, os.path.basename(self.path))
+        except (OSError, AttributeError):
+            self.inotify = None
+            return
+
+        def on_event():
+            if self.inotify.read():
+                self.changed.set()
+            if self.inotify.watch_gone:
+                self.stop_inotify()
+
+        asyncio.get_running_loop().add_reader(self.inotify.fd, on_event)
+
+    def stop_inotify(self) -> None:
+        if self.inotify is None:
+            return
+        asyncio.get_running_loop().remove_reader(self.inotify.fd)
+        self.inotify.close()
+        self.inotify = None
+
+    async def watch(self) -> None:
+        first = True
+        while True:
+            self.start_inotify()
+            self.changed.clear()
+            self.check(first)
+            first = False
+            try:
+                await asyncio.wait_for(self.changed.wait(), self.poll_interval * (5 if self.inotify else 1))
+            except asyncio.TimeoutError:
+                pass
+
+    async def batches(self) -> AsyncGenerator[list[str], None]:
+        watcher = asyncio.create_task(self.watch())
+        try:
+            while True:
+                await self.available.wait()
+                self.available.clear()
+                batch = list(self.buffer)
+                self.buffer.clear()
+                if batch:
+                    yield batch
+        finally:
+            watcher.cancel()
+            self.stop_inotify()
+            self.close_file()
@@ -1,76 +1,240 @@
 import asyncio
+import collections
 import hashlib
 import json
+import math
 import os
 import platform
 import shutil
+import time
 from typing import Any, AsyncGenerator, Callable
-import urllib.request
+import urllib.parse
 
 import jinja2
 
 import scrypted_sdk
-from scrypted_sdk import ScryptedDeviceBase, DeviceProvider, StreamService, TTYSettings, ScryptedDeviceType, ScryptedInterface, Settings, Setting, Readme, Scriptable, ScriptSource
+from scrypted_sdk import ScryptedDeviceBase, Camera, DeviceProvider, StreamService, TTYSettings, ScryptedDeviceType, ScryptedInterface, Settings, Setting, Readme, Scriptable, ScriptSource
+
+from coalesce import StreamStats, coalesce
+import download
+from facts import NodeFacts
+from logring import LEVELS, LogRing, to_records
+from logtail import LogTailer
+from metrics import MetricsHistory, ProcSampler
+import native
+import phases
+from phases import PhaseRecorder
+from pool import HandlePool, LatencyStats
+from probecache import ProbeCache, fingerprint_dir
+from promproxy import PrometheusProxy, ScrapeCache
+from recording import RecordingStore
+from session import SharedSession, follow_resizes, parse_control
+from snapshot import TerminalSnapshots
+from store import InstallStore
+from terminal import TerminalScreen
+from themecache import ThemeCache
 
 
 VERSON_JSON = open(os.path.join(os.environ['SCRYPTED_PLUGIN_VOLUME'], 'zip', 'unzipped', 'fs', 'cosmotop.json')).read()
 
 COSMOTOP_VERSION = json.loads(VERSON_JSON)['version']
+COSMOTOP_SHA256 = json.loads(VERSON_JSON).get('sha256')
 COSMOTOP_DOWNLOAD = f"https://github.com/bjia56/cosmotop/releases/download/{COSMOTOP_VERSION}/cosmotop"
 DOWNLOAD_CACHE_BUST = f"{platform.system()}-{platform.machine()}-{COSMOTOP_VERSION}-0"
 
 FILES_PATH = os.path.join(os.environ['SCRYPTED_PLUGIN_VOLUME'], 'files')
 CACHEBUST_PATH = os.path.join(FILES_PATH, 'cachebust')
+# last node bootstrap received by a cluster worker from the server
+BOOTSTRAP_PATH = os.path.join(FILES_PATH, 'bootstrap.json')
 
+# Content-addressed copies of the cosmotop binary, served by the server
+# instance to cluster workers. The APE binary is the same on every platform,
+# so entries are indexed by cosmotop version rather than DOWNLOAD_CACHE_BUST.
+BINARY_CACHE_PATH = os.path.join(FILES_PATH, 'cas')
+BINARY_CACHE_INDEX = os.path.join(BINARY_CACHE_PATH, 'index.json')
+BINARY_CHUNK_SIZE = 1024 * 1024
+BINARY_CHUNK_WINDOW = 4
 
-async def tail_f(file_path, check_interval=1):
-    """
-    Asynchronously tails a file like `tail -f`, yielding new content as it appears.
+WORKER_FORK_CONCURRENCY = 4
+WORKER_FORK_TIMEOUT = 60.0
+WORKER_FORK_ATTEMPTS = 5
+WORKER_FORK_BACKOFF = 2.0
+WORKER_FORK_BACKOFF_MAX = 60.0
 
-    :param file_path: Path to the file to tail.
-    :param check_interval: Time in seconds to wait between checks for the file or new content.
-    """
-    file = None
-    while True:
-        if os.path.exists(file_path):
-            if file is None:
-                file = open(file_path, 'r')
-                # Move to the end of the file
-                file.seek(0, 2)
-            line = file.readline()
-            if line:
-                yield line
-            else:
-                await asyncio.sleep(check_interval)
-        else:
-            if file is not None:
-                file.close()
-                file = None
-            await asyncio.sleep(check_interval)
+CLUSTER_MEMBERSHIP_INTERVAL = 30
+
+TERMSVC_POOL_SIZE = 1
+TERMSVC_POOL_TTL = 3600
+
+SHARED_SESSION_GRACE = 30
+
+SERVER_NODE_NAME = "server"
+
+NODE_FACTS_TTL = 300
+
+METRICS_INTERVAL = 1
+
+PROMETHEUS_SCRAPE_INTERVAL = 2.0
+
+RECORDINGS_PATH = os.path.join(FILES_PATH, 'recordings')
+RECORDING_MAX_MB = 256
+RECORDING_KEYFRAME_INTERVAL = 30
+
+SNAPSHOT_FPS = 1.0
+SNAPSHOT_FORMAT = 'jpeg'
+SNAPSHOT_FORMATS = ('jpeg', 'png')
+SNAPSHOT_COLS = 160
+SNAPSHOT_ROWS = 48
+SNAPSHOT_IDLE = 60
+
+OVERVIEW_TTL = 15
+OVERVIEW_NODE_TIMEOUT = 5
+
+CONFIG_PROPAGATION_TIMEOUT = 30
+
+THEME_CACHE_PATH = os.path.join(FILES_PATH, 'themes')
+THEME_DOWNLOAD_CONCURRENCY = 4
+
+STARTUP_HISTORY = 5
+
+CLUSTER_SETTING_DEFAULTS = {
+    'native_executable': True,
+    'shared_sessions': False,
+    'coalesce_output': False,
+    'record_sessions': False,
+}
+
+# numeric cluster settings, with their default, minimum and maximum
+CLUSTER_NUMBER_SETTINGS = {
+    'prometheus_interval': (PROMETHEUS_SCRAPE_INTERVAL, 0.5, 3600.0),
+    'snapshot_fps': (SNAPSHOT_FPS, 0.1, 30.0),
+    'recording_max_mb': (float(RECORDING_MAX_MB), 1.0, 1024.0 * 1024),
+}
+
+# numeric settings of the primary plugin instance that apply without a
+# restart, with their default, minimum and maximum
+WORKER_FORK_SETTINGS = {
+    'worker_fork_concurrency': (WORKER_FORK_CONCURRENCY, 1, 64),
+    'worker_fork_timeout': (WORKER_FORK_TIMEOUT, 1.0, 3600.0),
+}
 
 
 def name_hash(name):
     return hashlib.sha1(name.encode()).hexdigest()
 
 
-class CosmotopPlugin(ScryptedDeviceBase, StreamService, DeviceProvider, TTYSettings, Settings):
+def bootstrap_version(bootstrap: dict) -> str:
+    return hashlib.sha256(json.dumps(bootstrap, sort_keys=True).encode()).hexdigest()
+
+
+def parse_number(value: Any, default: float, minimum: float, maximum: float) -> float:
+    """
+    Parses a numeric setting, clamped to [minimum, maximum], falling back to
+    default if it is not a number.
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    if math.isnan(number):
+        return default
+    return min(max(number, minimum), maximum)
+
+
+def parse_urls(value: Any) -> list[str]:
+    """
+    Parses a stored list of URLs, ignoring anything that is not one.
+    """
+    try:
+        urls = json.loads(value) if value else []
+    except ValueError:
+        return []
+    return [url for url in urls if isinstance(url, str) and url] if isinstance(urls, list) else []
+
+
+def encode_boolean(value: Any) -> str:
+    return 'true' if value in (True, 'true') else 'false'
+
+
+def encode_urls(value: Any) -> str:
+    return json.dumps([url for url in (value if isinstance(value, list) else [value]) if isinstance(url, str) and url])
+
+
+def number_encoder(key: str) -> Callable[[Any], str]:
+    return lambda value: str(parse_number(value, *CLUSTER_NUMBER_SETTINGS[key]))
+
+
+def encode_snapshot_format(value: Any) -> str:
+    return value if value in SNAPSHOT_FORMATS else SNAPSHOT_FORMAT
+
+
+# how putSetting validates and stores each cluster setting; changing any of
+# them restarts the plugin on every node
+CLUSTER_SETTING_ENCODERS = {
+    **{key: encode_boolean for key in CLUSTER_SETTING_DEFAULTS},
+    **{key: number_encoder(key) for key in CLUSTER_NUMBER_SETTINGS},
+    'prometheus_upstreams': encode_urls,
+    'snapshot_format': encode_snapshot_format,
+}
+
+
+def terminate_fork(fork) -> None:
+    try:
+        fork.worker.terminate()
+    except Exception:
+        pass
+
+
+class CosmotopPlugin(ScryptedDeviceBase, StreamService, DeviceProvider, TTYSettings, Settings, Camera):
     LOG_FILE = os.path.expanduser(f'~/.config/cosmotop/cosmotop.log')
 
-    def __init__(self, nativeId: str = None, cluster_parent: 'CosmotopPlugin' = None, node_name: str = None) -> None:
+    def __init__(self, nativeId: str = None, cluster_parent: 'CosmotopPlugin' = None, node_name: str = None, worker_id: str = None) -> None:
         super().__init__(nativeId)
 
-        self.downloaded = asyncio.ensure_future(self.do_download())
-        self.log_loop = asyncio.create_task(self.tail_log_loop())
-
         self.cluster_parent = cluster_parent
         self.node_name = node_name
+        self.worker_id = worker_id
+        self.phases = PhaseRecorder()
+        self.facts = NodeFacts(NODE_FACTS_TTL)
+        self.termsvc_pool = HandlePool(self.resolve_termsvc, TERMSVC_POOL_SIZE, TERMSVC_POOL_TTL)
+        self.connect_latency = LatencyStats()
+        self.shared_session = None
+        self.snapshots = None
+        self.recordings = None
+        self.node_bootstrap = None
+        self.prometheus = None
+        self.stream_stats = StreamStats()
+        self.binary_sha256 = None
+        self.native_exe = None
+        self.exe_sha256 = None
+        self.store = InstallStore(FILES_PATH, CACHEBUST_PATH)
+
+        self.bootstrapped = self.phases.track('bootstrap', self.load_bootstrap()) if cluster_parent else None
+        self.downloaded = self.phases.track('downloaded', self.do_download())
+        self.prometheus_ready = asyncio.ensure_future(self.start_prometheus_proxy())
+        self.log_loop = asyncio.create_task(self.tail_log_loop())
+        self.metrics = MetricsHistory()
+        self.metrics_loop = asyncio.create_task(self.sample_metrics_loop())
+        asyncio.create_task(self.warm_termsvc_pool())
+
         if not cluster_parent:
-            self.discovered = asyncio.ensure_future(self.do_device_discovery())
+            self.discovered = self.phases.track('discovered', self.do_device_discovery())
             self.cluster_workers = {}
             self.cluster_worker_ids = {}
+            self.cluster_worker_names = {}
+            self.cluster_worker_forks = {}
+            self.cluster_worker_ready = {}
+            self.cluster_worker_timings = {}
+            self.worker_fork_semaphore = None
 
         self.config = CosmotopConfig("config", self)
         self.thememanager = CosmotopThemeManager("thememanager", self)
+        if not cluster_parent:
+            self.logs = CosmotopLogs("logs", self)
+            self.diagnostics = CosmotopDiagnostics("diagnostics", self)
+            self.overview = CosmotopOverview("overview", self)
+            self.recording_player = CosmotopRecordings("recordings", self)
+        asyncio.create_task(self.report_startup())
 
         async def cleanup_alert_migration():
             try:
@@ -88,67 +252,347 @@ class CosmotopPlugin(ScryptedDeviceBase, StreamService, DeviceProvider, TTYSetti
     async def lookup_worker_id(self, stable_id):
         return self.cluster_worker_ids[stable_id]
 
+    # can be called by the primary plugin instance
+    async def invalidate_routing(self) -> None:
+        self.worker_id = None
+        self.termsvc_pool.clear()
+
     async def do_download(self) -> None:
-        self.exe = os.path.join(os.environ['SCRYPTED_PLUGIN_VOLUME'], 'files', 'cosmotop')
+        self.store.migrate_legacy(['cosmotop', 'cosmotop.cmd'])
 
-        if not self.shouldDownloadCosmotop():
-            if platform.system() == 'Windows':
-                self.exe += '.cmd'
-            return
+        version_dir = self.store.version_dir(DOWNLOAD_CACHE_BUST)
+        self.exe = os.path.join(version_dir, 'cosmotop')
+        if platform.system() == 'Windows':
+            self.exe += '.cmd'
+
+        # the final executable only appears once a download is complete,
+        # so an existing one means this version is already installed
+        if not os.path.isfile(self.exe):
+            await self.install_cosmotop()
+        self.probe_cache = ProbeCache(os.path.join(version_dir, 'probes.json'))
+
+        if self.store.active() != DOWNLOAD_CACHE_BUST:
+            self.print("Activating cosmotop", DOWNLOAD_CACHE_BUST)
+            self.store.activate(DOWNLOAD_CACHE_BUST)
+        self.gc_versions()
+
+        await self.prepare_native()
 
-        shutil.rmtree(FILES_PATH, ignore_errors=True)
-        self.downloadFile(COSMOTOP_DOWNLOAD, 'cosmotop')
+        if not self.cluster_parent:
+            await self.cache_binary()
 
+    async def install_cosmotop(self) -> None:
+        download_path = os.path.join(self.store.version_dir(DOWNLOAD_CACHE_BUST), 'cosmotop')
+        if not self.cluster_parent or not await self.download_from_cluster_parent(download_path):
+            await self.download_from_github(download_path)
+
+        phases.count('bytes', os.path.getsize(download_path))
         if platform.system() != 'Windows':
-            os.chmod(self.exe, 0o755)
-        else:
-            os.rename(self.exe, self.exe + '.cmd')
-            self.exe += '.cmd'
+            os.chmod(download_path, 0o755)
+        os.replace(download_path, self.exe)
+
+    async def prepare_native(self) -> None:
+        """
+        Creates, or reuses if its hash still matches, a native executable
+        assimilated from the APE binary. Launches fall back to the APE
+        binary if this is disabled or fails.
+        """
+        self.native_exe = None
+        if platform.system() == 'Windows':
+            return
+
+        try:
+            if not await self.cluster_setting('native_executable'):
+                return
+
+            path = native.native_path(self.exe)
+            if not os.path.isfile(path) or not await native.verify(path):
+                self.print("Creating native cosmotop executable for", platform.machine())
+                phases.count('subprocesses')
+                path = await native.assimilate(self.exe)
+            self.native_exe = path
+        except:
+            self.print("Error creating native cosmotop executable, using the APE binary")
+            import traceback
+            traceback.print_exc()
 
-        with open(CACHEBUST_PATH, 'w') as f:
-            f.write(DOWNLOAD_CACHE_BUST)
+    # can be called from forks
+    async def get_node_bootstrap(self, known_version: str = None) -> dict:
+        """
+        Everything a worker needs from the primary plugin instance to start,
+        in a single call: the config template, theme URLs, cluster settings
+        and the cosmotop version. The version is a hash of the contents, so
+        only the version is returned if the caller already has it.
+        """
+        bootstrap = {
+            "config": await self.config.get_config(),
+            "theme_urls": await self.thememanager.theme_urls(),
+            "settings": await self.get_cluster_settings(),
+            "cosmotop_version": COSMOTOP_VERSION,
+        }
+        version = bootstrap_version(bootstrap)
+        if version == known_version:
+            return {"version": version}
+        return {"version": version, **bootstrap}
+
+    async def load_bootstrap(self) -> None:
+        """
+        Loads the node bootstrap on workers, revalidating the copy cached
+        on disk against the server. The cached copy is used as is if the
+        server cannot be reached.
+        """
+        try:
+            with open(BOOTSTRAP_PATH) as f:
+                self.node_bootstrap = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
 
-    def shouldDownloadCosmotop(self) -> bool:
         try:
-            if not os.path.exists(CACHEBUST_PATH):
-                return True
-            with open(CACHEBUST_PATH, 'r') as f:
-                return f.read() != DOWNLOAD_CACHE_BUST
+            await self.refresh_bootstrap()
         except:
-            return True
+            if self.node_bootstrap is None:
+                raise
+            self.print("Error fetching node bootstrap, using cached copy")
+            import traceback
+            traceback.print_exc()
+
+    async def refresh_bootstrap(self) -> int:
+        """
+        Fetches the node bootstrap from the server unless the cached version
+        is still current. Returns the number of bytes fetched.
+        """
+        known_version = self.node_bootstrap['version'] if self.node_bootstrap else None
+        bootstrap = await self.cluster_parent.get_node_bootstrap(known_version)
+        if bootstrap['version'] == known_version:
+            return 0
+
+        if bootstrap['cosmotop_version'] != COSMOTOP_VERSION:
+            self.print(f"Server runs cosmotop {bootstrap['cosmotop_version']}, this node runs {COSMOTOP_VERSION}")
+
+        serialized = json.dumps(bootstrap)
+        os.makedirs(FILES_PATH, exist_ok=True)
+        tmp = BOOTSTRAP_PATH + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(serialized)
+        os.replace(tmp, BOOTSTRAP_PATH)
+        self.node_bootstrap = bootstrap
+        phases.count('bytes', len(serialized.encode()))
+        return len(serialized.encode())
+
+    async def bootstrap(self) -> dict:
+        await self.bootstrapped
+        return self.node_bootstrap
 
-    def downloadFile(self, url: str, filename: str, extract: Callable[[str, str], None] = None) -> str:
+    # can be called from forks
+    async def get_cluster_settings(self) -> dict:
+        """
+        Settings stored on the primary plugin instance that apply to every
+        node. Workers receive them with the node bootstrap.
+        """
+        if self.cluster_parent:
+            return (await self.bootstrap())['settings']
+        settings = {
+            key: self.storage.getItem(key) == 'true' if self.storage.getItem(key) else default
+            for key, default in CLUSTER_SETTING_DEFAULTS.items()
+        }
+        settings['prometheus_upstreams'] = parse_urls(self.storage.getItem('prometheus_upstreams'))
+        for key, (default, minimum, maximum) in CLUSTER_NUMBER_SETTINGS.items():
+            settings[key] = parse_number(self.storage.getItem(key), default, minimum, maximum)
+        settings['snapshot_format'] = encode_snapshot_format(self.storage.getItem('snapshot_format'))
+        return settings
+
+    async def cluster_setting(self, key: str) -> Any:
+        return (await self.get_cluster_settings())[key]
+
+    async def start_prometheus_proxy(self) -> None:
+        """
+        Serves the configured Prometheus exporters on a local endpoint, so
+        that every cosmotop process on this node shares one scrape per
+        interval instead of polling the exporters on its own.
+        """
         try:
-            fullpath = os.path.join(FILES_PATH, filename)
-            if os.path.exists(fullpath):
-                raise Exception(f"{fullpath} already exists")
-            tmp = fullpath + '.tmp'
-            print("Creating directory for", tmp)
-            os.makedirs(os.path.dirname(fullpath), exist_ok=True)
-            print("Downloading", url)
-            response = urllib.request.urlopen(url)
-            if response.getcode() < 200 or response.getcode() >= 300:
-                raise Exception(f"Error downloading")
+            upstreams = await self.cluster_setting('prometheus_upstreams')
+            if not upstreams:
+                return
+            cache = ScrapeCache(upstreams, await self.cluster_setting('prometheus_interval'))
+            proxy = PrometheusProxy(cache)
+            await proxy.start()
+            self.prometheus = proxy
+            self.print("Serving Prometheus metrics from", ', '.join(upstreams), "at", proxy.endpoint())
+        except:
+            self.print("Error starting the Prometheus proxy")
+            import traceback
+            traceback.print_exc()
+
+    def command(self, *args: str) -> list[str]:
+        return native.command(self.exe, self.native_exe, *args)
+
+    def gc_versions(self) -> None:
+        try:
+            for version in self.store.gc():
+                self.print("Removed old cosmotop", version)
+        except:
+            import traceback
+            traceback.print_exc()
+
+    async def download_from_github(self, download_path: str) -> None:
+        if not COSMOTOP_SHA256:
+            self.print(f"No checksum published for cosmotop {COSMOTOP_VERSION}, skipping verification")
+        self.print("Downloading", COSMOTOP_DOWNLOAD)
+        try:
+            await download.download(
+                COSMOTOP_DOWNLOAD,
+                download_path,
+                sha256=COSMOTOP_SHA256,
+                report=lambda read, total: self.print(download.format_progress(COSMOTOP_DOWNLOAD, read, total)),
+            )
+        except:
+            self.print("Error downloading", COSMOTOP_DOWNLOAD)
+            import traceback
+            traceback.print_exc()
+            raise
+
+    async def download_from_cluster_parent(self, download_path: str) -> bool:
+        """
+        Pulls the cosmotop binary from the server instance's cache in
+        chunks, keeping a few chunk requests in flight at a time.
+        Returns False if the server cannot provide it, in which case the
+        caller falls back to GitHub.
+        """
+        tmp = download_path + '.cluster.tmp'
+        pending = collections.deque()
+        try:
+            info = await self.cluster_parent.get_binary_info(COSMOTOP_VERSION)
+            sha256 = info['sha256']
+            size = info['size']
+            if COSMOTOP_SHA256 and sha256 != COSMOTOP_SHA256:
+                raise Exception(f"Server has cosmotop {sha256}, expected {COSMOTOP_SHA256}")
+
+            self.print(f"Downloading cosmotop {COSMOTOP_VERSION} from the cluster server")
+            progress = download.ProgressThrottle(lambda read, total: self.print(download.format_progress("cluster server", read, total)))
+            offsets = iter(range(0, size, BINARY_CHUNK_SIZE))
+
+            def request_next():
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(asyncio.ensure_future(self.cluster_parent.read_binary_chunk(sha256, offset, BINARY_CHUNK_SIZE)))
+
+            for _ in range(BINARY_CHUNK_WINDOW):
+                request_next()
+
+            h = hashlib.sha256()
             read = 0
-            with open(tmp, "wb") as f:
-                while True:
-                    data = response.read(1024 * 1024)
-                    if not data:
-                        break
-                    read += len(data)
-                    print("Downloaded", read, "bytes")
+            os.makedirs(os.path.dirname(tmp), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                while pending:
+                    data = await pending.popleft()
+                    request_next()
+                    h.update(data)
                     f.write(data)
-            if extract:
-                extract(tmp, fullpath)
+                    read += len(data)
+                    progress.update(read, size)
+            progress.update(read, size, force=True)
+
+            if read != size or h.hexdigest() != sha256:
+                raise Exception("Checksum mismatch for cosmotop from the cluster server")
+
+            os.replace(tmp, download_path)
+            return True
+        except:
+            self.print("Error downloading cosmotop from the cluster server, falling back to GitHub")
+            import traceback
+            traceback.print_exc()
+            for task in pending:
+                task.cancel()
+            try:
                 os.remove(tmp)
-            else:
-                os.rename(tmp, fullpath)
-            return fullpath
+            except FileNotFoundError:
+                pass
+            return False
+
+    # should only be called on the primary plugin instance
+    async def cache_binary(self) -> None:
+        """
+        Adds the installed cosmotop binary to the content-addressed cache
+        that cluster workers download from.
+        """
+        try:
+            index = {}
+            if os.path.exists(BINARY_CACHE_INDEX):
+                with open(BINARY_CACHE_INDEX) as f:
+                    index = json.load(f)
+
+            sha256 = index.get(COSMOTOP_VERSION)
+            if sha256 and os.path.isfile(os.path.join(BINARY_CACHE_PATH, sha256)):
+                self.binary_sha256 = sha256
+                return
+
+            sha256 = await self.binary_hash()
+            os.makedirs(BINARY_CACHE_PATH, exist_ok=True)
+            cached = os.path.join(BINARY_CACHE_PATH, sha256)
+            if not os.path.isfile(cached):
+                try:
+                    os.link(self.exe, cached)
+                except OSError:
+                    await asyncio.to_thread(shutil.copyfile, self.exe, cached + '.tmp')
+                    os.replace(cached + '.tmp', cached)
+
+            # older versions can be rehashed from their install directory if rolled back to
+            for stale in set(index.values()) - {sha256}:
+                try:
+                    os.remove(os.path.join(BINARY_CACHE_PATH, stale))
+                except FileNotFoundError:
+                    pass
+            index = {COSMOTOP_VERSION: sha256}
+            with open(BINARY_CACHE_INDEX + '.tmp', 'w') as f:
+                json.dump(index, f)
+            os.replace(BINARY_CACHE_INDEX + '.tmp', BINARY_CACHE_INDEX)
+            self.binary_sha256 = sha256
         except:
-            print("Error downloading", url)
             import traceback
             traceback.print_exc()
-            raise
+
+    async def binary_hash(self) -> str:
+        """
+        SHA-256 of the installed binary, computed once per version and kept
+        in a sidecar file next to it.
+        """
+        if self.exe_sha256:
+            return self.exe_sha256
+
+        sidecar = self.exe + '.sha256'
+        try:
+            with open(sidecar) as f:
+                self.exe_sha256 = f.read().strip()
+        except FileNotFoundError:
+            pass
+
+        if not self.exe_sha256:
+            self.exe_sha256 = await asyncio.to_thread(download.sha256_file, self.exe)
+            with open(sidecar, 'w') as f:
+                f.write(self.exe_sha256)
+        return self.exe_sha256
+
+    # can be called from forks
+    async def get_binary_info(self, version: str) -> dict:
+        await self.downloaded
+        if version != COSMOTOP_VERSION or not self.binary_sha256:
+            raise Exception(f"cosmotop {version} is not cached on the server")
+        return {
+            "sha256": self.binary_sha256,
+            "size": os.path.getsize(os.path.join(BINARY_CACHE_PATH, self.binary_sha256)),
+        }
+
+    # can be called from forks
+    async def read_binary_chunk(self, sha256: str, offset: int, length: int) -> bytes:
+        if sha256 != self.binary_sha256:
+            raise Exception(f"{sha256} is not cached on the server")
+
+        def read():
+            with open(os.path.join(BINARY_CACHE_PATH, sha256), 'rb') as f:
+                f.seek(offset)
+                return f.read(min(length, BINARY_CHUNK_SIZE))
+        return await asyncio.to_thread(read)
 
     async def do_device_discovery(self) -> None:
         await self.downloaded
@@ -170,64 +614,361 @@ class CosmotopPlugin(ScryptedDeviceBase, StreamService, DeviceProvider, TTYSetti
                     ScryptedInterface.Readme.value,
                     ScryptedInterface.Settings.value,
                 ],
-            }
+            },
+            {
+                "nativeId": "logs",
+                "name": "Logs",
+                "type": ScryptedDeviceType.API.value,
+                "interfaces": [
+                    ScryptedInterface.Readme.value,
+                    ScryptedInterface.Settings.value,
+                ],
+            },
+            {
+                "nativeId": "overview",
+                "name": "Cluster Overview",
+                "type": ScryptedDeviceType.API.value,
+                "interfaces": [
+                    ScryptedInterface.Readme.value,
+                ],
+            },
+            {
+                "nativeId": "recordings",
+                "name": "Recordings",
+                "type": ScryptedDeviceType.API.value,
+                "interfaces": [
+                    ScryptedInterface.Readme.value,
+                    ScryptedInterface.Settings.value,
+                    ScryptedInterface.StreamService.value,
+                ],
+            },
+            {
+                "nativeId": "diagnostics",
+                "name": "Diagnostics",
+                "type": ScryptedDeviceType.API.value,
+                "interfaces": [
+                    ScryptedInterface.Readme.value,
+                ],
+            },
         ]
 
+        joined = []
         if scrypted_sdk.clusterManager:
             workers = await scrypted_sdk.clusterManager.getClusterWorkers()
-            for worker_id in list(workers.keys()):
-                worker = workers[worker_id]
+            for worker_id, worker in workers.items():
                 if worker['mode'] == 'server':
                     continue
+                stable_id = self.assign_stable_id(worker_id, worker['name'])
+                devices.append(self.worker_device(stable_id))
+                joined.append(stable_id)
 
-                stable_id_base = name_hash(worker['name']) # the worker id could change, so treat the name as stable
-                stable_id = stable_id_base
-                ctr = 1
-                while stable_id in self.cluster_worker_ids:
-                    stable_id = f"{stable_id_base}-{ctr}"
-                    ctr += 1
-
-                self.cluster_worker_ids[stable_id] = worker_id
-
-                devices.append({
-                    "nativeId": stable_id,
-                    "name": "cosmotop on " + worker['name'],
-                    "type": ScryptedDeviceType.API.value,
-                    "interfaces": [
-                        ScryptedInterface.StreamService.value,
-                        ScryptedInterface.TTY.value,
-                        ScryptedInterface.Settings.value,
-                    ],
-                })
-
+        # the full device list is only published once, so that devices of
+        # workers that left while the plugin was stopped are removed
         await scrypted_sdk.deviceManager.onDevicesChanged({
             "devices": devices,
             "providerNativeId": self.nativeId,
         })
 
+        self.worker_fork_semaphore = asyncio.Semaphore(self.worker_fork_concurrency())
+        for stable_id in joined:
+            self.launch_worker(stable_id)
+
         if scrypted_sdk.clusterManager:
-            for worker_id in list(workers.keys()):
-                worker = workers[worker_id]
-                if worker['mode'] == 'server':
-                    continue
+            self.membership_loop = asyncio.create_task(self.membership_reconcile_loop())
 
-                # get the stable id from the map
-                stable_id = None
-                for k, v in self.cluster_worker_ids.items():
-                    if v == worker_id:
-                        stable_id = k
-                        break
+    def assign_stable_id(self, worker_id: str, name: str) -> str:
+        stable_id_base = name_hash(name) # the worker id could change, so treat the name as stable
+        stable_id = stable_id_base
+        ctr = 1
+        while stable_id in self.cluster_worker_ids:
+            stable_id = f"{stable_id_base}-{ctr}"
+            ctr += 1
 
-                fork = scrypted_sdk.fork({ 'clusterWorkerId': worker_id })
+        self.cluster_worker_ids[stable_id] = worker_id
+        self.cluster_worker_names[stable_id] = name
+        return stable_id
+
+    def worker_device(self, stable_id: str) -> dict:
+        return {
+            "nativeId": stable_id,
+            "name": "cosmotop on " + self.cluster_worker_names[stable_id],
+            "type": ScryptedDeviceType.API.value,
+            "interfaces": [
+                ScryptedInterface.StreamService.value,
+                ScryptedInterface.TTY.value,
+                ScryptedInterface.Settings.value,
+                ScryptedInterface.Camera.value,
+            ],
+        }
+
+    def launch_worker(self, stable_id: str) -> None:
+        self.cluster_worker_ready[stable_id] = asyncio.ensure_future(
+            self.start_worker(self.worker_fork_semaphore, stable_id, self.cluster_worker_ids[stable_id], self.cluster_worker_names[stable_id])
+        )
+
+    def failed_worker(self, stable_id: str) -> bool:
+        ready = self.cluster_worker_ready.get(stable_id)
+        # retrieving the exception also keeps asyncio from logging it as
+        # never retrieved
+        return ready is not None and ready.done() and not ready.cancelled() and ready.exception() is not None
+
+    def teardown_worker(self, stable_id: str) -> None:
+        self.failed_worker(stable_id)
+        ready = self.cluster_worker_ready.pop(stable_id, None)
+        if ready:
+            ready.cancel()
+        fork = self.cluster_worker_forks.pop(stable_id, None)
+        if fork:
+            terminate_fork(fork)
+        self.cluster_workers.pop(stable_id, None)
+        self.cluster_worker_timings.pop(stable_id, None)
+        self.cluster_worker_ids.pop(stable_id, None)
+        self.cluster_worker_names.pop(stable_id, None)
+
+    async def membership_reconcile_loop(self) -> None:
+        while True:
+            await asyncio.sleep(CLUSTER_MEMBERSHIP_INTERVAL)
+            try:
+                await self.reconcile_membership()
+            except:
+                import traceback
+                traceback.print_exc()
+
+    async def reconcile_membership(self) -> None:
+        """
+        Diffs the current cluster workers against the known set, starting
+        forks only for workers that joined and tearing down those that left.
+        A worker that comes back under a new id with the same name keeps its
+        device and stable id. Workers whose fork gave up after all attempts
+        are started again.
+        """
+        workers = await scrypted_sdk.clusterManager.getClusterWorkers()
+        current = {
+            worker_id: worker
+            for worker_id, worker in workers.items()
+            if worker['mode'] != 'server'
+        }
+
+        known = set(self.cluster_worker_ids.values())
+        departed = [
+            stable_id
+            for stable_id, worker_id in self.cluster_worker_ids.items()
+            if worker_id not in current
+        ]
+        joined = [worker_id for worker_id in current if worker_id not in known]
+
+        for stable_id, worker_id in list(self.cluster_worker_ids.items()):
+            if worker_id in current and self.failed_worker(stable_id):
+                self.print(f"Retrying worker {self.cluster_worker_names[stable_id]}")
+                self.launch_worker(stable_id)
+
+        if not departed and not joined:
+            return
+
+        departed_names = {self.cluster_worker_names[stable_id]: stable_id for stable_id in departed}
+        for stable_id in departed:
+            self.teardown_worker(stable_id)
+
+        for worker_id in joined:
+            name = current[worker_id]['name']
+            stable_id = self.assign_stable_id(worker_id, name)
+            if departed_names.pop(name, None) == stable_id:
+                self.print(f"Worker {name} reconnected as {worker_id}")
+            else:
+                self.print(f"Worker {name} joined the cluster")
+                await scrypted_sdk.deviceManager.onDeviceDiscovered(self.worker_device(stable_id))
+            self.launch_worker(stable_id)
+
+        for name, stable_id in departed_names.items():
+            self.print(f"Worker {name} left the cluster")
+            await scrypted_sdk.deviceManager.onDeviceRemoved(stable_id)
+
+        # cached routes on the remaining workers may point at stale worker ids
+        for stable_id, worker in list(self.cluster_workers.items()):
+            try:
+                await worker.invalidate_routing()
+            except:
+                self.print(f"Error invalidating routing on worker {self.cluster_worker_names.get(stable_id)}")
+
+    def worker_fork_concurrency(self) -> int:
+        return int(parse_number(self.storage.getItem('worker_fork_concurrency'), *WORKER_FORK_SETTINGS['worker_fork_concurrency']))
+
+    def worker_fork_timeout(self) -> float:
+        return parse_number(self.storage.getItem('worker_fork_timeout'), *WORKER_FORK_SETTINGS['worker_fork_timeout'])
+
+    async def start_worker(self, semaphore: asyncio.Semaphore, stable_id: str, worker_id: str, name: str) -> Any:
+        """
+        Forks the plugin onto a cluster worker and connects to its
+        CosmotopPlugin instance, retrying with backoff. Each attempt is
+        bounded by the configured timeout.
+        """
+        timing = self.cluster_worker_timings[stable_id] = {
+            "name": name,
+            "attempts": 0,
+            "seconds": None,
+            "error": None,
+        }
+        start = time.monotonic()
+
+        async def attempt():
+            fork = scrypted_sdk.fork({ 'clusterWorkerId': worker_id })
+            self.cluster_worker_forks[stable_id] = fork
+            try:
                 result = await fork.result
-                connected_worker = await result.newCosmotopPlugin(stable_id, self, worker['name'])
-                self.cluster_workers[stable_id] = await scrypted_sdk.sdk.connectRPCObject(connected_worker)
+                connected_worker = await result.newCosmotopPlugin(stable_id, self, name, worker_id)
+                return await scrypted_sdk.sdk.connectRPCObject(connected_worker)
+            except:
+                terminate_fork(fork)
+                raise
+
+        delay = WORKER_FORK_BACKOFF
+        while True:
+            timing["attempts"] += 1
+            try:
+                async with semaphore:
+                    worker = await asyncio.wait_for(attempt(), self.worker_fork_timeout())
+                self.cluster_workers[stable_id] = worker
+                timing["seconds"] = time.monotonic() - start
+                timing["error"] = None
+                self.print(f"Worker {name} ready in {timing['seconds']:.2f}s after {timing['attempts']} attempt(s)")
+                return worker
+            except Exception as e:
+                timing["error"] = str(e) or type(e).__name__
+                if timing["attempts"] >= WORKER_FORK_ATTEMPTS:
+                    timing["seconds"] = time.monotonic() - start
+                    self.print(f"Worker {name} failed after {timing['attempts']} attempt(s): {timing['error']}")
+                    raise
+                self.print(f"Worker {name} attempt {timing['attempts']} failed, retrying in {delay}s: {timing['error']}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WORKER_FORK_BACKOFF_MAX)
 
     async def tail_log_loop(self):
         await self.downloaded
         self.print("--- Tailing log file ---")
-        async for line in tail_f(CosmotopPlugin.LOG_FILE):
-            self.print(line, end='')
+        tailer = LogTailer(CosmotopPlugin.LOG_FILE)
+        dropped = 0
+        async for batch in tailer.batches():
+            if tailer.dropped != dropped:
+                self.print(f"--- Dropped {tailer.dropped - dropped} log lines ---")
+                dropped = tailer.dropped
+            self.print(''.join(batch), end='')
+
+            # one RPC per batch to aggregate logs on the server
+            try:
+                if self.cluster_parent:
+                    await self.cluster_parent.ingest_logs(self.node_name, to_records(batch))
+                else:
+                    await self.ingest_logs(None, to_records(batch))
+            except:
+                import traceback
+                traceback.print_exc()
+
+    # can be called by the primary plugin instance
+    async def bootstrap_changed(self, version: str) -> dict:
+        """
+        Called on workers when the node bootstrap changed on the server. It
+        is only fetched again if the version differs from the cached one.
+        """
+        await self.config.config_reconciled
+        start = time.monotonic()
+        fetched = 0
+        if version != (await self.bootstrap())['version']:
+            previous = self.node_bootstrap
+            fetched = await self.refresh_bootstrap()
+            if self.config.apply_config(self.node_bootstrap['config']):
+                self.print("Applied updated configuration")
+            if self.node_bootstrap['theme_urls'] != previous['theme_urls']:
+                await self.thememanager.reload_themes()
+        return {
+            "bytes": fetched,
+            "seconds": time.monotonic() - start,
+        }
+
+    async def sample_metrics_loop(self) -> None:
+        sampler = ProcSampler()
+        if not sampler.available():
+            return
+        while True:
+            try:
+                values = sampler.sample()
+                if values is not None:
+                    self.metrics.add(time.time(), values)
+            except:
+                self.print("Error sampling metrics, stopping")
+                import traceback
+                traceback.print_exc()
+                sampler.close()
+                return
+            # stay aligned to whole intervals of the wall clock
+            await asyncio.sleep(METRICS_INTERVAL - time.time() % METRICS_INTERVAL)
+
+    # can be called by the primary plugin instance
+    async def node_health(self) -> dict:
+        """
+        A compact summary of this node's load, memory, disk and uptime.
+        """
+        latest = self.metrics.latest() or {}
+        try:
+            load = list(os.getloadavg())
+        except (AttributeError, OSError):
+            load = None
+        try:
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+        except (FileNotFoundError, ValueError, IndexError):
+            uptime = None
+        disk = shutil.disk_usage(FILES_PATH)
+        return {
+            "load": load,
+            "cpu_percent": latest.get('cpu_percent'),
+            "memory_percent": latest.get('memory_percent'),
+            "memory_gb": self.facts.get()['memory_gb'],
+            "disk_percent": 100.0 * disk.used / disk.total if disk.total else None,
+            "disk_free_gb": disk.free / 1024 ** 3,
+            "uptime": uptime,
+        }
+
+    # can be called by the primary plugin instance
+    async def query_metrics(self, start: float, end: float = None, resolution: int = None) -> dict:
+        """
+        Returns this node's metrics history between start and end, as wall
+        clock times. See MetricsHistory.query.
+        """
+        return self.metrics.query(start, end, resolution)
+
+    # should only be called on the primary plugin instance
+    async def query_node_metrics(self, node: str, start: float, end: float = None, resolution: int = None) -> dict:
+        if not node or node == SERVER_NODE_NAME:
+            return await self.query_metrics(start, end, resolution)
+        for stable_id, name in self.cluster_worker_names.items():
+            if name == node and stable_id in self.cluster_workers:
+                return await self.cluster_workers[stable_id].query_metrics(start, end, resolution)
+        raise Exception(f"Unknown cluster node {node}")
+
+    async def report_startup(self) -> None:
+        """
+        Sends this node's startup phases to the primary plugin instance
+        once they have all completed.
+        """
+        startup = [self.downloaded, self.config.default_config, self.config.config_reconciled, self.thememanager.themes_loaded]
+        startup.append(self.bootstrapped if self.cluster_parent else self.discovered)
+        await asyncio.gather(*startup, return_exceptions=True)
+        try:
+            if self.cluster_parent:
+                await self.cluster_parent.record_startup(self.node_name, self.phases.phases)
+            else:
+                await self.record_startup(None, self.phases.phases)
+        except:
+            import traceback
+            traceback.print_exc()
+
+    # can be called from forks
+    async def record_startup(self, node: str, phases: dict) -> None:
+        await self.diagnostics.record(node or SERVER_NODE_NAME, phases)
+
+    # can be called from forks
+    async def ingest_logs(self, node: str, records: list[list]) -> None:
+        self.logs.ring.add(node or SERVER_NODE_NAME, records)
 
     async def getDevice(self, nativeId: str) -> Any:
         await self.discovered
@@ -236,36 +977,190 @@ class CosmotopPlugin(ScryptedDeviceBase, StreamService, DeviceProvider, TTYSetti
             return self.config
         if nativeId == "thememanager":
             return self.thememanager
-
-        if nativeId in self.cluster_workers:
-            return self.cluster_workers[nativeId]
+        if nativeId == "logs":
+            return self.logs
+        if nativeId == "diagnostics":
+            return self.diagnostics
+        if nativeId == "overview":
+            return self.overview
+        if nativeId == "recordings":
+            return self.recording_player
+
+        if nativeId in self.cluster_worker_ready:
+            return await self.cluster_worker_ready[nativeId]
 
         # Management ui v2's PtyComponent expects the plugin device to implement
         # DeviceProvider and return the StreamService device via getDevice.
         return self
 
-    async def connectStream(self, input: AsyncGenerator[Any, Any] = None, options: Any = None) -> Any:
+    async def resolve_termsvc(self) -> Any:
         core = scrypted_sdk.systemManager.getDeviceByName("@scrypted/core")
         termsvc = await core.getDevice("terminalservice")
         if self.cluster_parent and scrypted_sdk.clusterManager:
-            worker_id = await self.cluster_parent.lookup_worker_id(self.nativeId)
-            termsvc = await termsvc.forkInterface(ScryptedInterface.StreamService.value, { 'clusterWorkerId': worker_id })
-        else:
-            termsvc = await scrypted_sdk.sdk.connectRPCObject(termsvc)
-        return await termsvc.connectStream(input, {
-            'cmd': [self.exe, '+t'],
-        })
+            # the worker id is handed over when the fork is created, and only
+            # looked up again if the primary instance invalidated it
+            if self.worker_id is None:
+                self.worker_id = await self.cluster_parent.lookup_worker_id(self.nativeId)
+            return await termsvc.forkInterface(ScryptedInterface.StreamService.value, { 'clusterWorkerId': self.worker_id })
+        return await scrypted_sdk.sdk.connectRPCObject(termsvc)
+
+    async def warm_termsvc_pool(self) -> None:
+        await self.downloaded
+        try:
+            await self.termsvc_pool.fill()
+        except:
+            self.print("Error connecting to the terminal service")
+            import traceback
+            traceback.print_exc()
+
+    async def open_terminal(self, input: AsyncGenerator[Any, Any]) -> AsyncGenerator[Any, Any]:
+        # a pooled handle may have gone stale, so retry once with a fresh one
+        for retry in range(2):
+            termsvc = await self.termsvc_pool.acquire()
+            try:
+                return await termsvc.connectStream(input, {
+                    'cmd': [self.native_exe or self.exe, '+t'],
+                })
+            except:
+                self.termsvc_pool.evict(termsvc)
+                if retry:
+                    raise
+
+    async def open_viewer_terminal(self, input: AsyncGenerator[Any, Any]) -> AsyncGenerator[Any, Any]:
+        if not await self.cluster_setting('record_sessions'):
+            return await self.open_terminal(input)
+
+        recorder = (await self.recording_store()).start()
+        try:
+            stream = await self.open_terminal(follow_resizes(input, recorder.screen))
+        except:
+            recorder.close()
+            raise
+        return recorder.record(stream)
+
+    async def recording_store(self) -> RecordingStore:
+        if self.recordings is None:
+            max_bytes = int(await self.cluster_setting('recording_max_mb') * 1024 * 1024)
+            if self.recordings is None:
+                self.recordings = RecordingStore(RECORDINGS_PATH, max_bytes, RECORDING_KEYFRAME_INTERVAL)
+                self.recordings.enforce_retention()
+        return self.recordings
+
+    # can be called by the primary plugin instance
+    async def list_recordings(self) -> list[dict]:
+        if not os.path.isdir(RECORDINGS_PATH):
+            return []
+        store = await self.recording_store()
+        return await asyncio.to_thread(store.list)
+
+    # can be called by the primary plugin instance
+    async def replay_recording(self, name: str, offset: float = 0, speed: float = 1.0) -> AsyncGenerator[bytes, None]:
+        return (await self.recording_store()).replay(name, offset, speed)
+
+    async def connectStream(self, input: AsyncGenerator[Any, Any] = None, options: Any = None) -> Any:
+        start = time.monotonic()
+        screen = None
+        if await self.cluster_setting('coalesce_output'):
+            # mirrors what the viewer has been sent, for when it falls too
+            # far behind
+            screen = TerminalScreen()
+            if input is not None:
+                input = follow_resizes(input, screen)
+        try:
+            if await self.cluster_setting('shared_sessions'):
+                stream = await self.attach_shared_session(input)
+            else:
+                # hold a reference on the installed version for as long as the
+                # session runs so garbage collection leaves it alone
+                self.store.acquire(DOWNLOAD_CACHE_BUST)
+                try:
+                    stream = self.track_session(await self.open_viewer_terminal(input), DOWNLOAD_CACHE_BUST)
+                except:
+                    self.store.release(DOWNLOAD_CACHE_BUST)
+                    raise
+        except:
+            self.connect_latency.fail()
+            raise
+
+        if screen is not None:
+            stream = coalesce(stream, stats=self.stream_stats, screen=screen)
+
+        self.connect_latency.record(time.monotonic() - start)
+        return stream
+
+    async def attach_shared_session(self, input: AsyncGenerator[Any, Any]) -> AsyncGenerator[Any, Any]:
+        if self.shared_session is None or self.shared_session.closed:
+            self.store.acquire(DOWNLOAD_CACHE_BUST)
+
+            def on_close():
+                self.shared_session = None
+                self.store.release(DOWNLOAD_CACHE_BUST)
+                self.gc_versions()
+
+            self.shared_session = SharedSession(self.open_viewer_terminal, SHARED_SESSION_GRACE, on_close=on_close)
+
+        session = self.shared_session
+        try:
+            return await session.attach(input)
+        except:
+            session.close()
+            raise
+
+    async def track_session(self, stream: AsyncGenerator[Any, Any], version: str) -> AsyncGenerator[Any, Any]:
+        try:
+            async for message in stream:
+                yield message
+        finally:
+            self.store.release(version)
+            self.gc_versions()
+
+    async def open_snapshot_terminal(self, input: AsyncGenerator[Any, Any]) -> AsyncGenerator[Any, Any]:
+        self.store.acquire(DOWNLOAD_CACHE_BUST)
+        try:
+            return self.track_session(await self.open_terminal(input), DOWNLOAD_CACHE_BUST)
+        except:
+            self.store.release(DOWNLOAD_CACHE_BUST)
+            raise
+
+    async def get_snapshots(self) -> TerminalSnapshots:
+        if self.snapshots is None:
+            await self.downloaded
+            fps = await self.cluster_setting('snapshot_fps')
+            format = await self.cluster_setting('snapshot_format')
+            if self.snapshots is None:
+                self.snapshots = TerminalSnapshots(self.open_snapshot_terminal, SNAPSHOT_COLS, SNAPSHOT_ROWS, fps, format, SNAPSHOT_IDLE)
+        return self.snapshots
+
+    async def takePicture(self, options: Any = None) -> Any:
+        """
+        Renders the screen of a headless cosmotop terminal on this node, as
+        a lightweight alternative to capturing it through a virtual display.
+        """
+        snapshots = await self.get_snapshots()
+        picture = await snapshots.picture()
+        return await scrypted_sdk.mediaManager.createMediaObject(picture, snapshots.mime_type)
+
+    async def getPictureOptions(self) -> Any:
+        width, height = (await self.get_snapshots()).picture_size()
+        return [{
+            "id": "cosmotop",
+            "name": "cosmotop",
+            "picture": {
+                "width": width,
+                "height": height,
+            },
+        }]
 
     async def getTTYSettings(self) -> Any:
         return {
-            "paths": [os.path.dirname(self.exe)],
+            "paths": [self.store.current_dir() or os.path.dirname(self.exe)],
         }
 
     async def getSettings(self) -> list[Setting]:
         await self.downloaded
         await self.config.config_reconciled
 
-        return [
+        settings = [
             {
                 "key": "cosmotop_executable",
                 "title": "cosmotop Path",
@@ -275,8 +1170,177 @@ class CosmotopPlugin(ScryptedDeviceBase, StreamService, DeviceProvider, TTYSetti
             },
         ]
 
+        if await self.cluster_setting('coalesce_output'):
+            settings.append({
+                "key": "stream_stats",
+                "title": "Terminal Stream Throughput",
+                "description": "Terminal output on this node since the last time this was shown.",
+                "value": self.stream_stats.summary(),
+                "readonly": True,
+            })
+
+        if self.prometheus:
+            settings.append({
+                "key": "prometheus_stats",
+                "title": "Prometheus Proxy",
+                "description": f"Scrapes served from {self.prometheus.endpoint()} on this node.",
+                "value": self.prometheus.cache.summary(),
+                "readonly": True,
+            })
+
+        if self.snapshots:
+            settings.append({
+                "key": "snapshot_stats",
+                "title": "Snapshots",
+                "description": "Snapshots of the headless cosmotop terminal on this node.",
+                "value": self.snapshots.summary(),
+                "readonly": True,
+            })
+
+        settings.append({
+            "key": "connect_latency",
+            "title": "Terminal Connect Latency",
+            "description": "Time taken to open a cosmotop terminal on this node.",
+            "value": self.connect_latency.summary(),
+            "readonly": True,
+        })
+
+        if self.native_exe:
+            settings.append({
+                "key": "cosmotop_native_executable",
+                "title": "Native cosmotop Path",
+                "description": f"Path to the native {platform.machine()} executable used to launch cosmotop.",
+                "value": self.native_exe,
+                "readonly": True,
+            })
+
+        if not self.cluster_parent and platform.system() != 'Windows':
+            settings.append({
+                "key": "native_executable",
+                "title": "Use Native Executable",
+                "description": "Launch cosmotop from a native executable assimilated from the downloaded binary, skipping the startup shell bootstrap. Applies to all cluster nodes.",
+                "type": "boolean",
+                "value": await self.cluster_setting('native_executable'),
+            })
+
+        if not self.cluster_parent:
+            settings.extend([
+                {
+                    "key": "shared_sessions",
+                    "title": "Shared Sessions",
+                    "description": "Share one cosmotop process per node between all viewers instead of starting one per viewer. Viewers joining later start from a snapshot of the current screen. Applies to all cluster nodes.",
+                    "type": "boolean",
+                    "value": await self.cluster_setting('shared_sessions'),
+                },
+                {
+                    "key": "coalesce_output",
+                    "title": "Coalesce Output",
+                    "description": "Batch terminal output into frames before sending it to viewers, and skip intermediate redraws for viewers that fall behind. Reduces traffic on slow links. Applies to all cluster nodes.",
+                    "type": "boolean",
+                    "value": await self.cluster_setting('coalesce_output'),
+                },
+                {
+                    "group": "Recording",
+                    "key": "record_sessions",
+                    "title": "Record Sessions",
+                    "description": "Record the output of every cosmotop terminal on each node, for replay from the Recordings device. Applies to all cluster nodes.",
+                    "type": "boolean",
+                    "value": await self.cluster_setting('record_sessions'),
+                },
+                {
+                    "group": "Recording",
+                    "key": "recording_max_mb",
+                    "title": "Recording Storage Limit",
+                    "description": "Megabytes of recordings to keep on each node. The oldest recordings are deleted first.",
+                    "type": "number",
+                    "value": await self.cluster_setting('recording_max_mb'),
+                },
+                {
+                    "group": "Prometheus",
+                    "key": "prometheus_upstreams",
+                    "title": "Prometheus Exporters",
+                    "description": "Exporter URLs, such as http://localhost:8080/metrics, to scrape on each node and serve from a shared local endpoint. Use {{ prometheus_endpoint }} in the configuration to point cosmotop at it. Applies to all cluster nodes.",
+                    "value": await self.cluster_setting('prometheus_upstreams'),
+                    "multiple": True,
+                },
+                {
+                    "group": "Prometheus",
+                    "key": "prometheus_interval",
+                    "title": "Prometheus Scrape Interval",
+                    "description": "Seconds to serve a scrape from the cache before the exporters are scraped again.",
+                    "type": "number",
+                    "value": await self.cluster_setting('prometheus_interval'),
+                },
+                {
+                    "group": "Snapshot",
+                    "key": "snapshot_fps",
+                    "title": "Snapshot Frame Rate",
+                    "description": "Maximum number of snapshots rendered per second on each node. Requests in between, or while the screen is unchanged, return the previous snapshot.",
+                    "type": "number",
+                    "value": await self.cluster_setting('snapshot_fps'),
+                },
+                {
+                    "group": "Snapshot",
+                    "key": "snapshot_format",
+                    "title": "Snapshot Format",
+                    "description": "Image format of snapshots. PNG keeps text sharp, JPEG is smaller.",
+                    "choices": list(SNAPSHOT_FORMATS),
+                    "value": await self.cluster_setting('snapshot_format'),
+                },
+            ])
+
+        if not self.cluster_parent and scrypted_sdk.clusterManager:
+            settings.extend([
+                {
+                    "group": "Cluster",
+                    "key": "worker_fork_concurrency",
+                    "title": "Worker Startup Concurrency",
+                    "description": "Maximum number of cluster workers to start at the same time.",
+                    "type": "number",
+                    "value": self.worker_fork_concurrency(),
+                },
+                {
+                    "group": "Cluster",
+                    "key": "worker_fork_timeout",
+                    "title": "Worker Startup Timeout",
+                    "description": "Seconds to wait for a cluster worker to start before retrying.",
+                    "type": "number",
+                    "value": self.worker_fork_timeout(),
+                },
+                {
+                    "group": "Cluster",
+                    "key": "worker_timings",
+                    "title": "Worker Startup Times",
+                    "type": "textarea",
+                    "value": "\n".join([
+                        f"{t['name']}: " + (f"{t['seconds']:.2f}s" if t['seconds'] is not None else "starting") +
+                        f", {t['attempts']} attempt(s)" + (f", last error: {t['error']}" if t['error'] else "")
+                        for t in self.cluster_worker_timings.values()
+                    ]),
+                    "readonly": True,
+                },
+            ])
+
+        return settings
+
     async def putSetting(self, key: str, value: str) -> None:
-        pass
+        if self.cluster_parent:
+            return
+
+        if key in CLUSTER_SETTING_ENCODERS:
+            self.storage.setItem(key, CLUSTER_SETTING_ENCODERS[key](value))
+            await self.onDeviceEvent(ScryptedInterface.Settings.value, None)
+
+            self.print("Settings updated, will restart...")
+            await scrypted_sdk.deviceManager.requestRestart()
+        elif key in WORKER_FORK_SETTINGS:
+            number = parse_number(value, *WORKER_FORK_SETTINGS[key])
+            self.storage.setItem(key, str(int(number) if key == "worker_fork_concurrency" else number))
+            if key == "worker_fork_concurrency" and self.worker_fork_semaphore is not None:
+                # workers already starting keep the old limit, the next
+                # ones to start use the new one
+                self.worker_fork_semaphore = asyncio.Semaphore(self.worker_fork_concurrency())
+            await self.onDeviceEvent(ScryptedInterface.Settings.value, None)
 
 
 class CosmotopConfig(ScryptedDeviceBase, Scriptable, Readme):
@@ -286,28 +1350,69 @@ class CosmotopConfig(ScryptedDeviceBase, Scriptable, Readme):
     def __init__(self, nativeId: str, parent: CosmotopPlugin) -> None:
         super().__init__(nativeId)
         self.parent = parent
-        self.cluster_parent_config = asyncio.ensure_future(parent.cluster_parent.getDevice("config")) if parent.cluster_parent else None
-        self.default_config = asyncio.ensure_future(self.load_default_config())
-        self.config_reconciled = asyncio.ensure_future(self.reconcile_from_disk())
+        self.default_config = parent.phases.track('default_config', self.load_default_config())
+        self.config_reconciled = parent.phases.track('config_reconciled', self.reconcile_from_disk())
         self.themes = []
+        self.propagation = {}
+        self.compiled_template = None
 
     # can be called from forks
     async def load_default_config(self) -> str:
         await self.parent.downloaded
+
+        # defaults only change with the binary
+        key = await self.parent.binary_hash()
+        output, fresh = self.parent.probe_cache.lookup('defaults', key)
+        if output is not None and fresh:
+            return output
+
+        output = await self.probe('--show-defaults')
+        self.parent.probe_cache.put('defaults', key, output)
+        return output
+
+    async def probe(self, arg: str) -> str:
         cosmotop = self.parent.exe
         assert cosmotop is not None
 
-        if platform.system() == 'Windows':
-            child = await asyncio.create_subprocess_exec(cosmotop, '--show-defaults', stdout=asyncio.subprocess.PIPE)
-        else:
-            child = await asyncio.create_subprocess_exec('sh', cosmotop, '--show-defaults', stdout=asyncio.subprocess.PIPE)
+        phases.count('subprocesses')
+        child = await asyncio.create_subprocess_exec(*self.parent.command(arg), stdout=asyncio.subprocess.PIPE)
         stdout, _ = await child.communicate()
 
         return stdout.decode()
 
+    async def themes_key(self) -> str:
+        return f"{await self.parent.binary_hash()}-{fingerprint_dir(CosmotopConfig.HOME_THEMES_DIR)}"
+
+    def parse_themes(self, output: str) -> None:
+        self.system_themes = []
+        self.bundled_themes = []
+        self.user_themes = []
+        loading_themes_to = None
+        for line in output.splitlines():
+            if "System themes:" in line:
+                loading_themes_to = self.system_themes
+            elif "Bundled themes:" in line:
+                loading_themes_to = self.bundled_themes
+            elif "User themes:" in line:
+                loading_themes_to = self.user_themes
+            elif loading_themes_to is not None and line.strip():
+                loading_themes_to.append(line.strip())
+
+    # should only be called on the primary plugin instance
+    async def refresh_themes(self, key: str) -> None:
+        try:
+            output = await self.probe('--show-themes')
+            self.parent.probe_cache.put('themes', key, output)
+            self.parse_themes(output)
+            await self.onDeviceEvent(ScryptedInterface.Readme.value, None)
+        except:
+            import traceback
+            traceback.print_exc()
+
     # can be called from forks
     async def reconcile_from_disk(self) -> None:
         await self.parent.downloaded
+        await self.parent.prometheus_ready
         await self.parent.thememanager.themes_loaded
 
         try:
@@ -320,51 +1425,30 @@ class CosmotopConfig(ScryptedDeviceBase, Scriptable, Readme):
                     f.write(await self.default_config)
             self.print(f"Using config file: {CosmotopConfig.CONFIG_PATH}")
 
-            with open(CosmotopConfig.CONFIG_PATH) as f:
-                data = f.read()
-
-            # Helper to render the config template
-            def render_config_template(template: str) -> str:
-                template = jinja2.Template(template)
-                return template.render(node=self.parent.node_name)
-
-            if self.cluster_parent_config is not None:
+            if self.parent.cluster_parent:
                 # Worker path
-                cluster_parent_config = await self.cluster_parent_config
-                rendered_config = render_config_template(await cluster_parent_config.get_config())
-                if data != rendered_config:
-                    with open(CosmotopConfig.CONFIG_PATH, 'w') as f:
-                        f.write(rendered_config)
+                self.apply_config(await self.get_config())
             else:
                 # Server path
                 while self.storage is None:
                     await asyncio.sleep(1)
 
-                rendered_config = render_config_template(await self.get_config())
+                rendered_config = self.render_config_template(await self.get_config())
 
-                if self.storage.getItem('config') and data != rendered_config:
-                    with open(CosmotopConfig.CONFIG_PATH, 'w') as f:
-                        f.write(rendered_config)
+                if self.storage.getItem('config'):
+                    self.write_config(rendered_config)
 
                 self.print(f"Using themes dir: {CosmotopConfig.HOME_THEMES_DIR}")
-                if platform.system() == 'Windows':
-                    child = await asyncio.create_subprocess_exec(cosmotop, '--show-themes', stdout=asyncio.subprocess.PIPE)
+                key = await self.themes_key()
+                output, fresh = self.parent.probe_cache.lookup('themes', key)
+                if output is None:
+                    await self.refresh_themes(key)
                 else:
-                    child = await asyncio.create_subprocess_exec('sh', cosmotop, '--show-themes', stdout=asyncio.subprocess.PIPE)
-                stdout, _ = await child.communicate()
-                self.system_themes = []
-                self.bundled_themes = []
-                self.user_themes = []
-                loading_themes_to = None
-                for line in stdout.decode().splitlines():
-                    if "System themes:" in line:
-                        loading_themes_to = self.system_themes
-                    elif "Bundled themes:" in line:
-                        loading_themes_to = self.bundled_themes
-                    elif "User themes:" in line:
-                        loading_themes_to = self.user_themes
-                    elif loading_themes_to is not None and line.strip():
-                        loading_themes_to.append(line.strip())
+                    # show the cached list right away, and refresh it in
+                    # the background if the binary or themes dir changed
+                    self.parse_themes(output)
+                    if not fresh:
+                        asyncio.create_task(self.refresh_themes(key))
 
                 await self.onDeviceEvent(ScryptedInterface.Readme.value, None)
                 await self.onDeviceEvent(ScryptedInterface.Scriptable.value, None)
@@ -372,10 +1456,73 @@ class CosmotopConfig(ScryptedDeviceBase, Scriptable, Readme):
             import traceback
             traceback.print_exc()
 
+    def render_config_template(self, template: str) -> str:
+        # the template only changes with the config version, so it is
+        # compiled once and reused for every render of that version
+        if self.compiled_template is None or self.compiled_template[0] != template:
+            self.compiled_template = (template, jinja2.Template(template))
+        return self.compiled_template[1].render(
+            node=self.parent.node_name,
+            prometheus_endpoint=self.parent.prometheus.endpoint() if self.parent.prometheus else "",
+            **self.parent.facts.get(),
+        )
+
+    def write_config(self, rendered: str) -> bool:
+        """
+        Atomically replaces the config file if its contents differ.
+        """
+        try:
+            with open(CosmotopConfig.CONFIG_PATH) as f:
+                if f.read() == rendered:
+                    return False
+        except FileNotFoundError:
+            pass
+
+        tmp = CosmotopConfig.CONFIG_PATH + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(rendered)
+        os.replace(tmp, CosmotopConfig.CONFIG_PATH)
+        return True
+
+    def apply_config(self, template: str) -> bool:
+        """
+        Renders the template for this node and writes it if the result
+        changed. Running cosmotop sessions pick up the new file when next
+        launched.
+        """
+        return self.write_config(self.render_config_template(template))
+
+    # should only be called on the primary plugin instance
+    async def propagate_config(self) -> None:
+        latest = (await self.parent.get_node_bootstrap())['version']
+        version = latest[:12]
+
+        async def push(stable_id, worker):
+            name = self.parent.cluster_worker_names.get(stable_id, stable_id)
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(worker.bootstrap_changed(latest), CONFIG_PROPAGATION_TIMEOUT)
+                self.propagation[name] = {
+                    "version": version,
+                    "seconds": time.monotonic() - start,
+                    "bytes": result["bytes"] + len(latest),
+                    "error": None,
+                }
+            except Exception as e:
+                self.propagation[name] = {
+                    "version": version,
+                    "seconds": time.monotonic() - start,
+                    "bytes": None,
+                    "error": str(e) or type(e).__name__,
+                }
+
+        await asyncio.gather(*[push(stable_id, worker) for stable_id, worker in list(self.parent.cluster_workers.items())])
+        await self.onDeviceEvent(ScryptedInterface.Readme.value, None)
+
     # can be called from forks
     async def get_config(self) -> str:
-        if self.cluster_parent_config is not None:
-            return await (await self.cluster_parent_config).get_config()
+        if self.parent.cluster_parent:
+            return (await self.parent.bootstrap())['config']
         if self.storage:
             cfg = self.storage.getItem('config')
             if cfg:
@@ -408,12 +1555,22 @@ class CosmotopConfig(ScryptedDeviceBase, Scriptable, Readme):
 
         self.storage.setItem('config', script['script'])
         await self.onDeviceEvent(ScryptedInterface.Scriptable.value, None)
-        self.print("Configuration updated, will restart...")
-        await scrypted_sdk.deviceManager.requestRestart()
+
+        self.apply_config(await self.get_config())
+        self.print("Configuration updated, pushing to workers...")
+        await self.propagate_config()
 
     # should only be called on the primary plugin instance
     async def getReadmeMarkdown(self) -> str:
         await self.config_reconciled
+        propagation = '\n'.join([
+            f"| {name} | {p['version']} | {p['seconds'] * 1000:.0f}ms | " + (str(p['bytes']) if p['error'] is None else f"failed: {p['error']}") + " |"
+            for name, p in self.propagation.items()
+        ])
+        system_themes, bundled_themes, user_themes = [
+            '\n'.join(['- ' + theme for theme in themes])
+            for themes in (self.system_themes, self.bundled_themes, self.user_themes)
+        ]
         return f"""
 # `cosmotop` Configuration
 
@@ -424,86 +1581,128 @@ Clearing the configuration will reset it to the default configuration.
 
 The configuration file is treated as a Jinja2 template, allowing the use of special variables.
 - `{{{{ node }}}}`: The name of the node (worker) this instance is running on. Empty for the main server instance.
+- `{{{{ cpu_count }}}}`: The number of CPUs on the node.
+- `{{{{ memory_gb }}}}`: The total memory of the node in GiB, also available in bytes as `{{{{ memory_bytes }}}}`.
+- `{{{{ arch }}}}`: The CPU architecture of the node, such as `x86_64` or `aarch64`.
+- `{{{{ os }}}}`: The operating system of the node, such as `Linux`, `Darwin` or `Windows`.
+- `{{{{ gpu }}}}` and `{{{{ npu }}}}`: Whether a GPU or NPU that `cosmotop` can monitor was found on the node.
+- `{{{{ prometheus_endpoint }}}}`: The node's shared Prometheus endpoint if exporters are configured in the plugin settings, otherwise empty. For example, `prometheus_endpoint = "{{{{ prometheus_endpoint }}}}"`.
+
+For example, `update_ms = {{{{ 4000 if cpu_count < 8 else 2000 }}}}` updates less often on smaller nodes.
+
+## Propagation
+
+Configuration and theme changes are pushed to cluster workers without restarting the plugin, and are used by `cosmotop` sessions started afterwards. The version identifies the settings each worker received.
+
+| Node | Version | Time | Bytes |
+|---|---|---|---|
+{propagation}
 
 ## Available themes
 
 Additional themes can be downloaded from the theme manager page.
 
 <u>System themes</u>:
-{'\n'.join(['- ' + theme for theme in self.system_themes])}
+{system_themes}
 
 <u>Bundled themes</u>:
-{'\n'.join(['- ' + theme for theme in self.bundled_themes])}
+{bundled_themes}
 
 <u>User themes</u>:
-{'\n'.join(['- ' + theme for theme in self.user_themes])}
+{user_themes}
 """
 
 
-class DownloaderBase(ScryptedDeviceBase):
-    def __init__(self, nativeId: str | None = None):
-        super().__init__(nativeId)
-
-    def downloadFile(self, url: str, filename: str):
-        try:
-            filesPath = os.path.join(os.environ['SCRYPTED_PLUGIN_VOLUME'], 'files')
-            fullpath = os.path.join(filesPath, filename)
-            if os.path.isfile(fullpath):
-                return fullpath
-            tmp = fullpath + '.tmp'
-            self.print("Creating directory for", tmp)
-            os.makedirs(os.path.dirname(fullpath), exist_ok=True)
-            self.print("Downloading", url)
-            response = urllib.request.urlopen(url)
-            if response.getcode() is not None and response.getcode() < 200 or response.getcode() >= 300:
-                raise Exception(f"Error downloading")
-            read = 0
-            with open(tmp, "wb") as f:
-                while True:
-                    data = response.read(1024 * 1024)
-                    if not data:
-                        break
-                    read += len(data)
-                    self.print("Downloaded", read, "bytes")
-                    f.write(data)
-            os.rename(tmp, fullpath)
-            return fullpath
-        except:
-            self.print("Error downloading", url)
-            import traceback
-            traceback.print_exc()
-            raise
-
-
-class CosmotopThemeManager(DownloaderBase, Settings, Readme):
+class CosmotopThemeManager(ScryptedDeviceBase, Settings, Readme):
     LOCAL_THEME_DIR = os.path.expanduser(f'~/.config/cosmotop/themes')
 
     def __init__(self, nativeId: str, parent: CosmotopPlugin) -> None:
         super().__init__(nativeId)
         self.parent = parent
-        self.cluster_parent_thememanager = asyncio.ensure_future(parent.cluster_parent.getDevice("thememanager")) if parent.cluster_parent else None
-        self.themes_loaded = asyncio.ensure_future(self.load_themes())
+        self.cache = ThemeCache(THEME_CACHE_PATH)
+        self.status = {}
+        self.themes_loaded = parent.phases.track('themes_loaded', self.load_themes())
 
     # can be called from forks
-    async def load_themes(self) -> None:
+    async def load_themes(self) -> bool:
+        """
+        Downloads the configured themes, a few at a time, revalidating
+        earlier downloads, and installs the ones that changed. Returns
+        whether the themes dir changed.
+        """
         self.print("Using themes dir:", CosmotopThemeManager.LOCAL_THEME_DIR)
         os.makedirs(CosmotopThemeManager.LOCAL_THEME_DIR, exist_ok=True)
         try:
             urls = await self.theme_urls()
-            for url in urls:
-                filename = url.split('/')[-1]
-                fullpath = self.downloadFile(url, filename)
-                target = os.path.join(CosmotopThemeManager.LOCAL_THEME_DIR, filename)
-                shutil.copyfile(fullpath, target)
-                self.print("Installed", target)
         except:
             import traceback
             traceback.print_exc()
+            return False
+
+        self.status = {}
+        semaphore = asyncio.Semaphore(THEME_DOWNLOAD_CONCURRENCY)
+
+        async def fetch(url):
+            async with semaphore:
+                try:
+                    sha256, updated = await self.cache.fetch(url)
+                    if updated:
+                        phases.count('bytes', os.path.getsize(self.cache.path(sha256)))
+                    self.status[url] = "downloaded" if updated else "up to date"
+                    return True
+                except Exception as e:
+                    self.status[url] = f"failed: {str(e) or type(e).__name__}"
+                    self.print("Error downloading", url)
+                    import traceback
+                    traceback.print_exc()
+                    return False
+
+        fetched = await asyncio.gather(*[fetch(url) for url in urls])
+
+        changed = False
+        installed = {}
+        for url, ok in zip(urls, fetched):
+            if not ok:
+                continue
+            filename = os.path.basename(urllib.parse.urlsplit(url).path)
+            target = os.path.join(CosmotopThemeManager.LOCAL_THEME_DIR, filename)
+            if target in installed:
+                self.print(f"{url} and {installed[target]} are both named {filename}, using {url}")
+            installed[target] = url
+            try:
+                # unchanged themes are left alone so the themes dir fingerprint stays stable
+                if self.cache.install(url, target):
+                    self.print("Installed", target)
+                    changed = True
+            except Exception as e:
+                self.status[url] = f"failed: {str(e) or type(e).__name__}"
+                import traceback
+                traceback.print_exc()
+
+        try:
+            for target in self.cache.prune(urls):
+                self.print("Removed", target)
+                changed = True
+        except:
+            import traceback
+            traceback.print_exc()
+        return changed
+
+    # can be called from forks
+    async def reload_themes(self) -> None:
+        """
+        Installs the current theme URLs without restarting, refreshing the
+        theme list shown on the config device if anything changed.
+        """
+        await self.themes_loaded
+        self.themes_loaded = asyncio.ensure_future(self.load_themes())
+        if await self.themes_loaded and not self.parent.cluster_parent:
+            await self.parent.config.refresh_themes(await self.parent.config.themes_key())
 
     # can be called from forks
     async def theme_urls(self) -> list[str]:
-        if self.cluster_parent_thememanager is not None:
-            return await (await self.cluster_parent_thememanager).theme_urls()
+        if self.parent.cluster_parent:
+            return (await self.parent.bootstrap())['theme_urls']
         if self.storage:
             urls = self.storage.getItem('theme_urls')
             if urls:
@@ -527,15 +1726,433 @@ class CosmotopThemeManager(DownloaderBase, Settings, Readme):
         self.storage.setItem(key, json.dumps(value))
         await self.onDeviceEvent(ScryptedInterface.Settings.value, None)
 
-        self.print("Themes updated, will restart...")
-        await scrypted_sdk.deviceManager.requestRestart()
+        await self.reload_themes()
+        await self.onDeviceEvent(ScryptedInterface.Readme.value, None)
+        self.print("Themes updated, pushing to workers...")
+        await self.parent.config.propagate_config()
 
     # should only be called on the primary plugin instance
     async def getReadmeMarkdown(self) -> str:
+        await self.themes_loaded
+        status = '\n'.join([f"| {url} | {state} |" for url, state in self.status.items()])
         return f"""
 # Theme Manager
 
 List themes to download and install in the local theme directory. Themes will be installed to `{CosmotopThemeManager.LOCAL_THEME_DIR}`.
+
+Themes are downloaded again only if they changed upstream, and changes to the list are applied to every cluster node without restarting the plugin.
+
+| URL | Status |
+|---|---|
+{status}
+"""
+
+
+class CosmotopLogs(ScryptedDeviceBase, Settings, Readme):
+    MAX_BYTES = 4 * 1024 * 1024
+    # default, minimum and maximum number of lines shown
+    LIMIT = (100, 1, 10000)
+
+    def __init__(self, nativeId: str, parent: CosmotopPlugin) -> None:
+        super().__init__(nativeId)
+        self.parent = parent
+        self.ring = LogRing(CosmotopLogs.MAX_BYTES)
+
+    def filter(self, key: str) -> str:
+        return self.storage.getItem(key) or "" if self.storage else ""
+
+    def limit(self) -> int:
+        return int(parse_number(self.filter("limit"), *CosmotopLogs.LIMIT))
+
+    # should only be called on the primary plugin instance
+    async def getSettings(self) -> list[Setting]:
+        return [
+            {
+                "key": "node",
+                "title": "Node",
+                "description": "Only show logs from this node.",
+                "choices": ["All", *self.ring.nodes],
+                "value": self.filter("node") or "All",
+            },
+            {
+                "key": "level",
+                "title": "Level",
+                "description": "Only show logs of this level.",
+                "choices": ["All", *LEVELS],
+                "value": self.filter("level") or "All",
+            },
+            {
+                "key": "search",
+                "title": "Search",
+                "description": "Only show logs containing this text.",
+                "value": self.filter("search"),
+            },
+            {
+                "key": "limit",
+                "title": "Limit",
+                "description": "Maximum number of log lines to show.",
+                "type": "number",
+                "value": self.limit(),
+            },
+        ]
+
+    # should only be called on the primary plugin instance
+    async def putSetting(self, key: str, value: str) -> None:
+        if key == "limit":
+            value = int(parse_number(value, *CosmotopLogs.LIMIT))
+        self.storage.setItem(key, "" if value == "All" else str(value))
+        await self.onDeviceEvent(ScryptedInterface.Settings.value, None)
+        await self.onDeviceEvent(ScryptedInterface.Readme.value, None)
+
+    # should only be called on the primary plugin instance
+    async def getReadmeMarkdown(self) -> str:
+        entries = self.ring.query(
+            node=self.filter("node") or None,
+            level=self.filter("level") or None,
+            text=self.filter("search") or None,
+            limit=self.limit(),
+        )
+        counts = '\n'.join([
+            f"| {node} | " + " | ".join(str(self.ring.counts[(node, level)]) for level in LEVELS) + " |"
+            for node in self.ring.nodes
+        ])
+        lines = '\n'.join([
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(e['timestamp']))} [{e['node']}] {e['text']}"
+            for e in entries
+        ])
+        return f"""
+# Logs
+
+`cosmotop` logs from every node in the cluster, most recent last. Use the settings to filter by node, level or text.
+
+| Node | {' | '.join(LEVELS)} |
+|---|{'---|' * len(LEVELS)}
+{counts}
+
+```
+{lines}
+```
+"""
+
+
+class CosmotopDiagnostics(ScryptedDeviceBase, Readme):
+    def __init__(self, nativeId: str, parent: CosmotopPlugin) -> None:
+        super().__init__(nativeId)
+        self.parent = parent
+        self.current = {
+            "started": time.time(),
+            "nodes": {},
+        }
+
+    def history(self) -> list[dict]:
+        """
+        Startup records of recent runs, most recent first, with the
+        current run in place of its stored copy.
+        """
+        history = []
+        if self.storage:
+            try:
+                history = json.loads(self.storage.getItem('startup_history') or '[]')
+            except ValueError:
+                pass
+        history = [run for run in history if run["started"] != self.current["started"]]
+        return [self.current, *history][:STARTUP_HISTORY]
+
+    # should only be called on the primary plugin instance
+    async def record(self, node: str, phases: dict) -> None:
+        self.current["nodes"][node] = phases
+        if self.storage:
+            self.storage.setItem('startup_history', json.dumps(self.history()))
+        await self.onDeviceEvent(ScryptedInterface.Readme.value, None)
+
+    # should only be called on the primary plugin instance
+    async def getReadmeMarkdown(self) -> str:
+        def counters(phase):
+            return ', '.join(f"{value} {name}" for name, value in phase["counters"].items())
+
+        def duration(phase):
+            return f"{(phase['end'] - phase['start']) * 1000:.0f}ms" if phase["end"] is not None else "running"
+
+        current = '\n'.join([
+            f"| {node} | {name} | {phase['start'] * 1000:.0f}ms | {duration(phase)} | {phase['outcome'] or ''} | {counters(phase)} |"
+            for node, node_phases in sorted(self.current["nodes"].items())
+            for name, phase in sorted(node_phases.items(), key=lambda item: item[1]["start"])
+        ])
+
+        def slowest(node_phases):
+            finished = [(name, phase) for name, phase in node_phases.items() if phase["end"] is not None]
+            if not finished:
+                return ""
+            name, phase = max(finished, key=lambda item: item[1]["end"] - item[1]["start"])
+            return f"{name} ({duration(phase)})"
+
+        history = '\n'.join([
+            f"| {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['started']))} | {node} | "
+            f"{max((phase['end'] or 0) for phase in node_phases.values()) * 1000:.0f}ms | {slowest(node_phases)} |"
+            for run in self.history()[1:]
+            for node, node_phases in sorted(run["nodes"].items())
+            if node_phases
+        ])
+        return f"""
+# Diagnostics
+
+## Startup
+
+Startup phases of each node in the current run. Times are relative to the start of the plugin on that node.
+
+| Node | Phase | Start | Duration | Outcome | Counters |
+|---|---|---|---|---|---|
+{current}
+
+## Previous runs
+
+| Started | Node | Ready after | Slowest phase |
+|---|---|---|---|
+{history}
+"""
+
+
+class CosmotopOverview(ScryptedDeviceBase, Readme):
+    """
+    Health of every cluster node at a glance.
+
+    Node health is cached for OVERVIEW_TTL seconds. Showing the page always
+    uses the cache and, once it is stale, refreshes it in the background,
+    asking every node in parallel. Each node has OVERVIEW_NODE_TIMEOUT
+    seconds to answer; nodes that don't keep their last known health and
+    are marked as stale.
+    """
+
+    def __init__(self, nativeId: str, parent: CosmotopPlugin) -> None:
+        super().__init__(nativeId)
+        self.parent = parent
+        self.entries = {}
+        self.refreshed = None
+        self.refreshing = None
+
+    def nodes(self) -> dict:
+        """
+        Maps node names to their plugin instance, or to None for workers
+        without one, along with the reason.
+        """
+        nodes = {SERVER_NODE_NAME: (self.parent, None)}
+        for stable_id, name in list(self.parent.cluster_worker_names.items()):
+            worker = self.parent.cluster_workers.get(stable_id)
+            ready = self.parent.cluster_worker_ready.get(stable_id)
+            nodes[name] = (worker, "starting" if ready is not None and not ready.done() else "not running")
+        return nodes
+
+    async def refresh_node(self, name: str, node: Any, reason: str) -> None:
+        entry = self.entries.setdefault(name, {"health": None, "updated": None, "error": None})
+        if node is None:
+            entry["error"] = reason
+            return
+        try:
+            entry["health"] = await asyncio.wait_for(node.node_health(), OVERVIEW_NODE_TIMEOUT)
+            entry["updated"] = time.monotonic()
+            entry["error"] = None
+        except asyncio.TimeoutError:
+            entry["error"] = "timed out"
+        except Exception as e:
+            entry["error"] = str(e) or type(e).__name__
+
+    async def refresh(self) -> None:
+        try:
+            nodes = self.nodes()
+            for name in [name for name in self.entries if name not in nodes]:
+                del self.entries[name]
+            await asyncio.gather(*[self.refresh_node(name, node, reason) for name, (node, reason) in nodes.items()])
+            self.refreshed = time.monotonic()
+            await self.onDeviceEvent(ScryptedInterface.Readme.value, None)
+        except:
+            import traceback
+            traceback.print_exc()
+        finally:
+            self.refreshing = None
+
+    def revalidate(self) -> None:
+        stale = self.refreshed is None or time.monotonic() - self.refreshed > OVERVIEW_TTL
+        if stale and self.refreshing is None:
+            self.refreshing = asyncio.create_task(self.refresh())
+
+    # should only be called on the primary plugin instance
+    async def getReadmeMarkdown(self) -> str:
+        self.revalidate()
+        now = time.monotonic()
+
+        def percent(value):
+            return f"{value:.0f}%" if value is not None else "-"
+
+        def duration(seconds):
+            if seconds is None:
+                return "-"
+            days, rest = divmod(int(seconds), 86400)
+            return f"{days}d {rest // 3600}h" if days else f"{rest // 3600}h {rest % 3600 // 60}m"
+
+        def status(entry):
+            if entry["error"] is None:
+                return "ok"
+            if entry["updated"] is None:
+                return entry["error"]
+            return f"stale ({entry['error']}, {now - entry['updated']:.0f}s old)"
+
+        rows = []
+        for name in self.nodes():
+            entry = self.entries.get(name)
+            if entry is None:
+                rows.append(f"| {name} | waiting | - | - | - | - | - |")
+                continue
+            health = entry["health"] or {}
+            load = ' '.join(f"{value:.2f}" for value in health["load"]) if health.get("load") else "-"
+            memory = percent(health.get("memory_percent")) + (f" of {health['memory_gb']} GiB" if health.get("memory_gb") else "")
+            disk = percent(health.get("disk_percent")) + (f", {health['disk_free_gb']:.1f} GiB free" if health.get("disk_free_gb") is not None else "")
+            rows.append(
+                f"| {name} | {status(entry)} | {load} | {percent(health.get('cpu_percent'))} | {memory} | {disk} | {duration(health.get('uptime'))} |"
+            )
+        table = '\n'.join(rows)
+        refreshed = f"{now - self.refreshed:.0f}s ago" if self.refreshed is not None else "never"
+
+        return f"""
+# Cluster Overview
+
+Health of every node running `cosmotop`, refreshed in the background at most every {OVERVIEW_TTL} seconds. Last refreshed {refreshed}.
+
+| Node | Status | Load (1m 5m 15m) | CPU | Memory | Disk | Uptime |
+|---|---|---|---|---|---|---|
+{table}
+"""
+
+
+class CosmotopRecordings(ScryptedDeviceBase, StreamService, Settings, Readme):
+    """
+    Replays cosmotop sessions recorded on any cluster node. The recording,
+    where to start and the playback speed are picked in the settings, and
+    opening the terminal of this device plays it.
+    """
+    # numeric settings, with their default, minimum and maximum
+    NUMBER_SETTINGS = {
+        'offset': (0.0, 0.0, 7 * 24 * 60.0),
+        'speed': (1.0, 0.1, 100.0),
+    }
+
+    def __init__(self, nativeId: str, parent: CosmotopPlugin) -> None:
+        super().__init__(nativeId)
+        self.parent = parent
+
+    def setting(self, key: str) -> str:
+        return self.storage.getItem(key) or "" if self.storage else ""
+
+    def number(self, key: str) -> float:
+        return parse_number(self.setting(key), *CosmotopRecordings.NUMBER_SETTINGS[key])
+
+    def label(self, recording: dict) -> str:
+        return f"{recording['node']} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(recording['start']))}"
+
+    async def recordings(self) -> list[dict]:
+        """
+        Recordings of every node that answers in time, newest first.
+        """
+        async def list_node(name, node):
+            try:
+                return [{**recording, "node": name} for recording in await asyncio.wait_for(node.list_recordings(), OVERVIEW_NODE_TIMEOUT)]
+            except Exception:
+                return []
+
+        nodes = self.parent.overview.nodes()
+        found = await asyncio.gather(*[list_node(name, node) for name, (node, _) in nodes.items() if node is not None])
+        return sorted([recording for recordings in found for recording in recordings], key=lambda recording: recording["start"], reverse=True)
+
+    # should only be called on the primary plugin instance
+    async def getSettings(self) -> list[Setting]:
+        recordings = await self.recordings()
+        return [
+            {
+                "key": "recording",
+                "title": "Recording",
+                "description": "Recording to play when the terminal is opened.",
+                "choices": [self.label(recording) for recording in recordings],
+                "value": self.setting("recording") or (self.label(recordings[0]) if recordings else ""),
+            },
+            {
+                "key": "offset",
+                "title": "Start At",
+                "description": "Minutes into the recording to start playing from.",
+                "type": "number",
+                "value": self.number("offset"),
+            },
+            {
+                "key": "speed",
+                "title": "Speed",
+                "description": "Playback speed, where 1 is real time.",
+                "type": "number",
+                "value": self.number("speed"),
+            },
+        ]
+
+    # should only be called on the primary plugin instance
+    async def putSetting(self, key: str, value: str) -> None:
+        if key in CosmotopRecordings.NUMBER_SETTINGS:
+            value = parse_number(value, *CosmotopRecordings.NUMBER_SETTINGS[key])
+        self.storage.setItem(key, str(value))
+        await self.onDeviceEvent(ScryptedInterface.Settings.value, None)
+
+    # should only be called on the primary plugin instance
+    async def connectStream(self, input: AsyncGenerator[Any, Any] = None, options: Any = None) -> Any:
+        recordings = await self.recordings()
+        selected = self.setting("recording")
+        matches = [recording for recording in recordings if self.label(recording) == selected] or recordings[:1]
+        if not matches:
+            raise Exception("No recordings available. Enable Record Sessions in the plugin settings.")
+        recording = matches[0]
+
+        node = self.parent.overview.nodes()[recording["node"]][0]
+        stream = await node.replay_recording(recording["name"], self.number("offset") * 60, self.number("speed"))
+        return self.play(stream, input)
+
+    async def play(self, stream: AsyncGenerator[Any, Any], input: AsyncGenerator[Any, Any]) -> AsyncGenerator[Any, Any]:
+        closed = asyncio.Event()
+
+        async def read_input():
+            # input is only watched for the viewer closing the terminal
+            try:
+                async for message in input:
+                    control = parse_control(message)
+                    if control is not None and 'eof' in control:
+                        break
+            finally:
+                closed.set()
+
+        reader = asyncio.create_task(read_input()) if input is not None else None
+        try:
+            async for data in stream:
+                if closed.is_set():
+                    return
+                yield data
+            yield b'\r\n\x1b[0m-- end of recording --\r\n'
+        finally:
+            if reader:
+                reader.cancel()
+
+    # should only be called on the primary plugin instance
+    async def getReadmeMarkdown(self) -> str:
+        def duration(recording):
+            seconds = int((recording["end"] or recording["start"]) - recording["start"])
+            return f"{seconds // 3600}h {seconds % 3600 // 60}m {seconds % 60}s"
+
+        rows = '\n'.join([
+            f"| {recording['node']} | {self.label(recording)[len(recording['node']) + 1:]} | {duration(recording)} | {recording['bytes'] / 1024 ** 2:.1f} MiB | {'recording' if recording['active'] else 'finished'} |"
+            for recording in await self.recordings()
+        ])
+        return f"""
+# Recordings
+
+`cosmotop` sessions recorded on every node while Record Sessions is enabled in the plugin settings. Pick a recording, where to start and the playback speed in the settings, then open the terminal of this device to replay it.
+
+Each node keeps its recordings in `{RECORDINGS_PATH}`, deleting the oldest once they exceed the storage limit.
+
+| Node | Started | Duration | Size | Status |
+|---|---|---|---|---|
+{rows}
 """
 
 
@@ -544,8 +2161,8 @@ def create_scrypted_plugin():
 
 
 class CosmotopForkEntry:
-    async def newCosmotopPlugin(self, nativeId: str = None, cluster_parent: CosmotopPlugin = None, node_name: str = None):
-        return CosmotopPlugin(nativeId=nativeId, cluster_parent=cluster_parent, node_name=node_name)
+    async def newCosmotopPlugin(self, nativeId: str = None, cluster_parent: CosmotopPlugin = None, node_name: str = None, worker_id: str = None):
+        return CosmotopPlugin(nativeId=nativeId, cluster_parent=cluster_parent, node_name=node_name, worker_id=worker_id)
 
 
 async def fork():
@@ -0,0 +1,242 @@
+import array
+import os
+import time
+
+
+METRICS = ['cpu_percent', 'memory_percent', 'load1', 'net_rx_bps', 'net_tx_bps']
+
+# (seconds per sample, number of samples): 10 minutes at 1s, 1 day at 1m
+# and 1 week at 1h
+RESOLUTIONS = [(1, 600), (60, 1440), (3600, 168)]
+
+
+class Ring:
+    """
+    Fixed-size ring of timestamped samples, with the average and the peak
+    of every metric stored in preallocated arrays.
+    """
+
+    def __init__(self, step: int, size: int, metrics: int) -> None:
+        self.step = step
+        self.size = size
+        self.times = array.array('d', bytes(8 * size))
+        self.avg = [array.array('d', bytes(8 * size)) for _ in range(metrics)]
+        self.peak = [array.array('d', bytes(8 * size)) for _ in range(metrics)]
+        self.count = 0
+
+    def append(self, timestamp: float, avg: list[float], peak: list[float]) -> None:
+        i = self.count % self.size
+        self.times[i] = timestamp
+        for k in range(len(avg)):
+            self.avg[k][i] = avg[k]
+            self.peak[k][i] = peak[k]
+        self.count += 1
+
+    def oldest(self) -> float | None:
+        if not self.count:
+            return None
+        return self.times[self.count % self.size if self.count > self.size else 0]
+
+    def indexes(self) -> range:
+        return range(max(0, self.count - self.size), self.count)
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.times, *self.avg, *self.peak))
+
+
+class Bucket:
+    """
+    Running average and peak of the samples falling into one slot of a
+    coarser ring.
+    """
+
+    def __init__(self, metrics: int) -> None:
+        self.start = None
+        self.count = 0
+        self.sums = [0.0] * metrics
+        self.peaks = [0.0] * metrics
+
+    def add(self, values: list[float]) -> None:
+        if self.count:
+            for k, value in enumerate(values):
+                self.sums[k] += value
+                if value > self.peaks[k]:
+                    self.peaks[k] = value
+        else:
+            self.sums[:] = values
+            self.peaks[:] = values
+        self.count += 1
+
+    def flush(self, ring: Ring) -> None:
+        ring.append(self.start, [total / self.count for total in self.sums], list(self.peaks))
+        self.count = 0
+
+
+class MetricsHistory:
+    """
+    Multi-resolution history of node metrics in constant memory.
+
+    Samples go into the finest ring as they are, and are averaged into one
+    entry per step of every coarser ring, which also keeps the peak value
+    seen within the step so short spikes remain visible.
+
+    :param metrics: Names of the sampled values, in order.
+    :param resolutions: (seconds per sample, number of samples) of each ring, finest first.
+    """
+
+    def __init__(self, metrics: list[str] = METRICS, resolutions: list[tuple[int, int]] = RESOLUTIONS) -> None:
+        self.metrics = metrics
+        self.rings = [Ring(step, size, len(metrics)) for step, size in resolutions]
+        self.buckets = [Bucket(len(metrics)) for _ in self.rings[1:]]
+
+    def add(self, timestamp: float, values: list[float]) -> None:
+        self.rings[0].append(timestamp, values, values)
+        for ring, bucket in zip(self.rings[1:], self.buckets):
+            start = timestamp - timestamp % ring.step
+            if bucket.count and start != bucket.start:
+                bucket.flush(ring)
+            bucket.start = start
+            bucket.add(values)
+
+    def nbytes(self) -> int:
+        return sum(ring.nbytes() for ring in self.rings)
+
+    def latest(self) -> dict | None:
+        """
+        Returns the most recent sample by metric name, or None if empty.
+        """
+        ring = self.rings[0]
+        if not ring.count:
+            return None
+        i = (ring.count - 1) % ring.size
+        return {name: ring.avg[k][i] for k, name in enumerate(self.metrics)}
+
+    def query(self, start: float, end: float = None, resolution: int = None) -> dict:
+        """
+        Returns the samples between start and end, as wall clock times,
+        from the ring with the given resolution in seconds. Without one,
+        the finest ring that still reaches back to start is used.
+        """
+        end = end if end is not None else time.time()
+        if resolution is not None:
+            rings = [ring for ring in self.rings if ring.step == resolution]
+            if not rings:
+                raise ValueError(f"No {resolution}s resolution, available: {[ring.step for ring in self.rings]}")
+            ring = rings[0]
+        else:
+            # fall back to the ring reaching back the furthest, preferring
+            # finer ones on ties
+            filled = [candidate for candidate in self.rings if candidate.count]
+            reaching = [candidate for candidate in filled if candidate.oldest() <= start]
+            if reaching:
+                ring = reaching[0]
+            elif filled:
+                ring = min(filled, key=lambda candidate: candidate.oldest())
+            else:
+                ring = self.rings[0]
+
+        times = []
+        avg = {name: [] for name in self.metrics}
+        peak = {name: [] for name in self.metrics}
+        for n in ring.indexes():
+            i = n % ring.size
+            timestamp = ring.times[i]
+            if timestamp < start or timestamp > end:
+                continue
+            times.append(timestamp)
+            for k, name in enumerate(self.metrics):
+                avg[name].append(ring.avg[k][i])
+                peak[name].append(ring.peak[k][i])
+        return {
+            "resolution": ring.step,
+            "time": times,
+            "avg": avg,
+            "max": peak,
+        }
+
+
+def read_fd(fd: int) -> bytes:
+    chunks = []
+    offset = 0
+    while True:
+        data = os.pread(fd, 65536, offset)
+        if not data:
+            return b''.join(chunks)
+        chunks.append(data)
+        offset += len(data)
+
+
+class ProcSampler:
+    """
+    Samples the metrics in METRICS from /proc, keeping the files open
+    between samples. Rates are computed against the previous sample, so
+    the first call returns None.
+
+    :param proc: Mount point of procfs.
+    """
+
+    FILES = ['stat', 'meminfo', 'loadavg', 'net/dev']
+
+    def __init__(self, proc: str = '/proc') -> None:
+        self.proc = proc
+        self.fds = None
+        self.previous = None
+
+    def available(self) -> bool:
+        return all(os.path.isfile(os.path.join(self.proc, name)) for name in ProcSampler.FILES)
+
+    def read(self) -> tuple:
+        if self.fds is None:
+            self.fds = [os.open(os.path.join(self.proc, name), os.O_RDONLY) for name in ProcSampler.FILES]
+        stat, meminfo, loadavg, netdev = [read_fd(fd) for fd in self.fds]
+
+        # cpu  user nice system idle iowait irq softirq steal guest guest_nice
+        cpu = [int(field) for field in stat[:stat.index(b'\n')].split()[1:9]]
+        total = sum(cpu)
+        idle = cpu[3] + cpu[4]
+
+        memory = {}
+        for line in meminfo.split(b'\n'):
+            if line.startswith((b'MemTotal:', b'MemAvailable:')):
+                key, value = line.split(b':')
+                memory[key] = int(value.split()[0])
+                if len(memory) == 2:
+                    break
+
+        rx = tx = 0
+        for line in netdev.split(b'\n')[2:]:
+            if b':' not in line:
+                continue
+            name, fields = line.split(b':', 1)
+            if name.strip() == b'lo':
+                continue
+            fields = fields.split()
+            rx += int(fields[0])
+            tx += int(fields[8])
+
+        load1 = float(loadavg.split(b' ', 1)[0])
+        return time.monotonic(), total, idle, memory, load1, rx, tx
+
+    def sample(self) -> list[float] | None:
+        current = self.read()
+        previous, self.previous = self.previous, current
+        if previous is None:
+            return None
+
+        now, total, idle, memory, load1, rx, tx = current
+        then, last_total, last_idle, _, _, last_rx, last_tx = previous
+        elapsed = max(now - then, 1e-6)
+        ticks = total - last_total
+        mem_total = memory.get(b'MemTotal', 0)
+        return [
+            100.0 * (ticks - (idle - last_idle)) / ticks if ticks > 0 else 0.0,
+            100.0 * (mem_total - memory.get(b'MemAvailable', 0)) / mem_total if mem_total else 0.0,
+            load1,
+            max(0, rx - last_rx) / elapsed,
+            max(0, tx - last_tx) / elapsed,
+        ]
+
+    def close(self) -> None:
+        for fd in self.fds or []:
+            os.close(fd)
+        self.fds = None
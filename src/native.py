@@ -0,0 +1,73 @@
+import asyncio
+import os
+import platform
+import shutil
+
+import download
+
+
+# ELF, and Mach-O 64-bit in either byte order
+NATIVE_MAGIC = (b'\x7fELF', b'\xcf\xfa\xed\xfe', b'\xfe\xed\xfa\xcf')
+
+
+def native_path(exe: str) -> str:
+    return os.path.join(os.path.dirname(exe), f'cosmotop-native-{platform.machine()}')
+
+
+def is_native(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(4) in NATIVE_MAGIC
+
+
+def command(exe: str, native: str | None, *args: str) -> list[str]:
+    """
+    Builds the argv to launch cosmotop, preferring the native executable.
+    """
+    if native:
+        return [native, *args]
+    if platform.system() == 'Windows':
+        return [exe, *args]
+    return ['sh', exe, *args]
+
+
+async def assimilate(exe: str) -> str:
+    """
+    Produces a platform-native copy of the APE binary exe for the current
+    machine, so that launches skip the APE shell bootstrap. The result is
+    written next to exe along with a .sha256 sidecar, and its path returned.
+    """
+    if platform.system() == 'Windows':
+        raise Exception("APE assimilation is not needed on Windows")
+
+    dest = native_path(exe)
+    tmp = dest + '.tmp'
+    await asyncio.to_thread(shutil.copyfile, exe, tmp)
+    os.chmod(tmp, 0o755)
+    try:
+        child = await asyncio.create_subprocess_exec('sh', tmp, '--assimilate', stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+        _, stderr = await child.communicate()
+        if child.returncode != 0 or not is_native(tmp):
+            raise Exception(f"Assimilation failed: {stderr.decode().strip()}")
+
+        sha256 = await asyncio.to_thread(download.sha256_file, tmp)
+        with open(dest + '.sha256', 'w') as f:
+            f.write(sha256)
+        os.replace(tmp, dest)
+        return dest
+    finally:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+
+
+async def verify(path: str) -> bool:
+    """
+    Checks a native executable produced by assimilate against its sidecar hash.
+    """
+    try:
+        with open(path + '.sha256') as f:
+            expected = f.read().strip()
+        return await asyncio.to_thread(download.sha256_file, path) == expected
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,63 @@
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable
+
+
+# the phase record of the task currently running, inherited by the tasks
+# and threads it starts
+current_phase = contextvars.ContextVar('current_phase', default=None)
+
+
+def count(counter: str, amount: int = 1) -> None:
+    """
+    Adds amount to a counter, such as bytes or subprocesses, of the phase
+    the caller runs in. Does nothing outside of a tracked phase.
+    """
+    phase = current_phase.get()
+    if phase is not None:
+        counters = phase["counters"]
+        counters[counter] = counters.get(counter, 0) + amount
+
+
+class PhaseRecorder:
+    """
+    Records when named startup phases start and end, how they ended, and
+    the counters added with count() while they ran.
+
+    Times are seconds since the recorder was created, so that phases from
+    nodes with unrelated monotonic clocks can be compared. Tracking a phase
+    costs two clock reads and a context variable update.
+    """
+
+    def __init__(self) -> None:
+        self.origin = time.monotonic()
+        self.phases: dict[str, dict] = {}
+
+    def track(self, name: str, awaitable: Awaitable) -> asyncio.Future:
+        """
+        Schedules awaitable as the named phase and returns its future.
+        """
+        return asyncio.ensure_future(self.run(name, awaitable))
+
+    async def run(self, name: str, awaitable: Awaitable) -> Any:
+        phase = self.phases[name] = {
+            "start": time.monotonic() - self.origin,
+            "end": None,
+            "outcome": None,
+            "counters": {},
+        }
+        token = current_phase.set(phase)
+        try:
+            result = await awaitable
+            phase["outcome"] = "ok"
+            return result
+        except asyncio.CancelledError:
+            phase["outcome"] = "cancelled"
+            raise
+        except Exception as e:
+            phase["outcome"] = f"error: {str(e) or type(e).__name__}"
+            raise
+        finally:
+            phase["end"] = time.monotonic() - self.origin
+            current_phase.reset(token)
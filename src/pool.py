@@ -0,0 +1,79 @@
+import asyncio
+import collections
+import statistics
+import time
+from typing import Any, Awaitable, Callable
+
+
+class HandlePool:
+    """
+    Keeps a small set of resolved RPC handles warm so callers skip the
+    lookups needed to create one.
+
+    Handles are handed out round-robin. A handle is dropped when it is older
+    than ttl seconds or when a caller reports it failed with evict(), and a
+    replacement is resolved on the next acquire().
+
+    :param resolve: Coroutine function that creates a new handle.
+    :param size: Number of handles to keep.
+    :param ttl: Maximum age of a handle in seconds.
+    """
+
+    def __init__(self, resolve: Callable[[], Awaitable[Any]], size: int = 1, ttl: float = 3600) -> None:
+        self.resolve = resolve
+        self.size = size
+        self.ttl = ttl
+        self.handles: list[tuple[Any, float]] = []
+        self.next = 0
+        self.lock = asyncio.Lock()
+
+    def prune(self) -> None:
+        now = time.monotonic()
+        self.handles = [(handle, created) for handle, created in self.handles if now - created < self.ttl]
+
+    async def fill(self) -> None:
+        async with self.lock:
+            self.prune()
+            while len(self.handles) < self.size:
+                self.handles.append((await self.resolve(), time.monotonic()))
+
+    async def acquire(self) -> Any:
+        self.prune()
+        if len(self.handles) < self.size:
+            await self.fill()
+        self.next = (self.next + 1) % len(self.handles)
+        return self.handles[self.next][0]
+
+    def evict(self, handle: Any) -> None:
+        self.handles = [(h, created) for h, created in self.handles if h is not handle]
+
+    def clear(self) -> None:
+        self.handles = []
+
+
+class LatencyStats:
+    """
+    Rolling latency statistics over the most recent samples.
+    """
+
+    def __init__(self, window: int = 100) -> None:
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.failures = 0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def fail(self) -> None:
+        self.failures += 1
+
+    def summary(self) -> str:
+        if not self.samples:
+            return f"no samples, {self.failures} failure(s)"
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return (
+            f"last {self.samples[-1] * 1000:.0f}ms, mean {statistics.mean(ordered) * 1000:.0f}ms, "
+            f"p95 {p95 * 1000:.0f}ms over {len(ordered)} of {self.count} connection(s), {self.failures} failure(s)"
+        )
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+
+
+def fingerprint_dir(path: str) -> str:
+    """
+    Cheap fingerprint of a directory's contents, built from the name, size
+    and mtime of each entry rather than from file contents.
+    """
+    h = hashlib.sha1()
+    try:
+        entries = sorted(os.scandir(path), key=lambda e: e.name)
+    except FileNotFoundError:
+        return 'missing'
+    for entry in entries:
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        h.update(f"{entry.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+class ProbeCache:
+    """
+    On-disk cache of cosmotop probe output, such as --show-defaults.
+
+    Each entry stores the output together with the key it was produced
+    under. A lookup with a different key still returns the old output, marked
+    stale, so callers can use it while refreshing in the background.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries = None
+
+    def load(self) -> dict:
+        if self.entries is None:
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def lookup(self, name: str, key: str) -> tuple[str | None, bool]:
+        """
+        Returns (output, fresh). Output is None if nothing was ever cached.
+        """
+        entry = self.load().get(name)
+        if entry is None:
+            return None, False
+        return entry['output'], entry['key'] == key
+
+    def put(self, name: str, key: str, output: str) -> None:
+        self.load()[name] = {
+            'key': key,
+            'output': output,
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
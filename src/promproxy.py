@@ -0,0 +1,184 @@
+import asyncio
+import re
+import time
+import urllib.request
+
+
+SAMPLE_NAME = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*')
+# suffixes of the samples making up histogram and summary families
+FAMILY_SUFFIXES = ('_bucket', '_sum', '_count', '_total', '_created', '_info')
+
+
+def family_name(sample: str) -> str:
+    for suffix in FAMILY_SUFFIXES:
+        if sample.endswith(suffix):
+            return sample[:-len(suffix)]
+    return sample
+
+
+def parse(text: str) -> dict[str, list[str]]:
+    """
+    Splits Prometheus exposition text into metric families, keyed by name,
+    each with its HELP and TYPE comments and samples. Malformed lines are
+    dropped.
+    """
+    families = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            parts = line.split(None, 3)
+            if len(parts) >= 3 and parts[1] in ('HELP', 'TYPE'):
+                families.setdefault(parts[2], []).append(line)
+            continue
+        match = SAMPLE_NAME.match(line)
+        if not match or len(line[match.end():].split()) == 0:
+            continue
+        name = match.group(0)
+        if name not in families and family_name(name) in families:
+            name = family_name(name)
+        families.setdefault(name, []).append(line)
+    return families
+
+
+def merge(texts: list[str]) -> tuple[str, int]:
+    """
+    Merges the exposition text of several exporters into one. A family
+    exported by more than one is taken from the first, since duplicates
+    would make the result invalid. Returns the text and its sample count.
+    """
+    merged = {}
+    for text in texts:
+        for name, lines in parse(text).items():
+            merged.setdefault(name, lines)
+    lines = [line for family in merged.values() for line in family]
+    samples = sum(1 for line in lines if not line.startswith('#'))
+    return '\n'.join(lines) + '\n', samples
+
+
+def fetch_text(url: str, timeout: float) -> str:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        charset = response.headers.get_content_charset() or 'utf-8'
+        return response.read().decode(charset, errors='replace')
+
+
+class ScrapeCache:
+    """
+    Scrapes upstream Prometheus exporters at most once per interval, no
+    matter how many readers ask. Requests arriving while a scrape is in
+    flight wait for it instead of starting another. If every upstream
+    fails, the last successful scrape keeps being served.
+
+    :param upstreams: Exporter URLs.
+    :param interval: Seconds a scrape is served from the cache.
+    :param timeout: Seconds to wait for each upstream.
+    """
+
+    def __init__(self, upstreams: list[str], interval: float = 2.0, timeout: float = 5.0) -> None:
+        self.upstreams = upstreams
+        self.interval = interval
+        self.timeout = timeout
+        self.text = None
+        self.samples = 0
+        self.fetched = None
+        self.inflight = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def get(self) -> str | None:
+        if self.fetched is not None and time.monotonic() - self.fetched < self.interval:
+            self.hits += 1
+            return self.text
+        if self.inflight is None:
+            self.misses += 1
+            self.inflight = asyncio.ensure_future(self.scrape())
+        else:
+            self.coalesced += 1
+        await asyncio.shield(self.inflight)
+        return self.text
+
+    async def scrape(self) -> None:
+        try:
+            results = await asyncio.gather(*[
+                asyncio.to_thread(fetch_text, url, self.timeout) for url in self.upstreams
+            ], return_exceptions=True)
+            texts = [result for result in results if isinstance(result, str)]
+            self.errors += len(results) - len(texts)
+            if texts:
+                self.text, self.samples = merge(texts)
+                self.fetched = time.monotonic()
+        finally:
+            self.inflight = None
+
+    def stats_text(self) -> str:
+        lines = []
+        for key in ('hits', 'misses', 'coalesced', 'errors'):
+            name = f"cosmotop_scrape_proxy_{key}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {getattr(self, key)}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses, {self.coalesced} coalesced, {self.errors} upstream errors, {self.samples} samples cached"
+
+
+class PrometheusProxy:
+    """
+    Minimal HTTP server publishing a ScrapeCache, with its own counters
+    appended, on every path.
+
+    :param cache: Cache to serve.
+    :param host: Address to listen on.
+    :param port: Port to listen on, or 0 for any free port.
+    """
+
+    def __init__(self, cache: ScrapeCache, host: str = '127.0.0.1', port: int = 0) -> None:
+        self.cache = cache
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def endpoint(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            method = request.split(b' ', 1)[0]
+            if method not in (b'GET', b'HEAD'):
+                await self.respond(writer, '405 Method Not Allowed', b'')
+                return
+            text = await self.cache.get()
+            if text is None:
+                await self.respond(writer, '503 Service Unavailable', b'no upstream exporter answered\n')
+                return
+            body = (text + self.cache.stats_text()).encode()
+            await self.respond(writer, '200 OK', b'' if method == b'HEAD' else body, len(body))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except:
+            import traceback
+            traceback.print_exc()
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: str, body: bytes, length: int = None) -> None:
+        writer.write((
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body) if length is None else length}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        ).encode() + body)
+        await writer.drain()
+
+    def close(self) -> None:
+        if self.server:
+            self.server.close()
@@ -0,0 +1,436 @@
+import asyncio
+import bisect
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Any, AsyncGenerator
+
+from session import to_bytes
+from terminal import TerminalScreen
+
+
+# A recording is a set of segment files, each starting with a keyframe so it
+# can be replayed on its own. A segment is the magic followed by records:
+#
+#   header: kind (u8), timestamp (f64), payload length (u32)
+#   KEYFRAME payload: cols (u16), rows (u16), zlib(screen snapshot)
+#   OUTPUT payload: zlib(messages), each a time offset from the record
+#       timestamp (f32), length (u32) and the data
+#   INDEX payload: (timestamp (f64), offset (u64)) of every keyframe
+#
+# Closed segments end with an INDEX record and a trailer pointing at it.
+# Segments of recordings that were not closed cleanly are indexed by walking
+# the record headers.
+MAGIC = b'COSMOREC'
+TRAILER_MAGIC = b'COSMOIDX'
+HEADER = struct.Struct('<BdI')
+TRAILER = struct.Struct('<Q8s')
+DIMENSIONS = struct.Struct('<HH')
+MESSAGE = struct.Struct('<fI')
+INDEX_ENTRY = struct.Struct('<dQ')
+
+KEYFRAME = 1
+OUTPUT = 2
+INDEX = 3
+
+SEGMENT_SUFFIX = '.rec'
+
+
+def segment_name(session: str, sequence: int) -> str:
+    return f"{session}.{sequence:05d}{SEGMENT_SUFFIX}"
+
+
+def parse_segment_name(name: str) -> tuple[str, int] | None:
+    if not name.endswith(SEGMENT_SUFFIX):
+        return None
+    session, _, sequence = name[:-len(SEGMENT_SUFFIX)].rpartition('.')
+    if not session or not sequence.isdigit():
+        return None
+    return session, int(sequence)
+
+
+class SegmentWriter:
+    """
+    Appends records to one segment file. Output is buffered and written as
+    one compressed record per chunk.
+
+    :param path: File to create.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.size = len(MAGIC)
+        self.index = []
+        self.last = None
+        self.chunk = []
+        self.chunk_start = None
+        self.chunk_bytes = 0
+
+    def append(self, kind: int, timestamp: float, payload: bytes) -> None:
+        offset = self.size
+        self.file.write(HEADER.pack(kind, timestamp, len(payload)))
+        self.file.write(payload)
+        self.size += HEADER.size + len(payload)
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+        if kind == KEYFRAME:
+            self.index.append((timestamp, offset))
+
+    def keyframe(self, timestamp: float, cols: int, rows: int, snapshot: bytes) -> None:
+        self.flush()
+        self.append(KEYFRAME, timestamp, DIMENSIONS.pack(cols, rows) + zlib.compress(snapshot))
+
+    def output(self, timestamp: float, data: bytes) -> None:
+        if self.chunk_start is None:
+            self.chunk_start = timestamp
+        self.chunk.append(MESSAGE.pack(timestamp - self.chunk_start, len(data)))
+        self.chunk.append(data)
+        self.chunk_bytes += len(data)
+        # output chunks are stamped with their start, the segment ends with
+        # the last message
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+
+    def flush(self) -> None:
+        if self.chunk:
+            self.append(OUTPUT, self.chunk_start, zlib.compress(b''.join(self.chunk)))
+            self.chunk = []
+            self.chunk_start = None
+            self.chunk_bytes = 0
+        self.file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        offset = self.size
+        self.append(INDEX, self.last or 0.0, b''.join(INDEX_ENTRY.pack(*entry) for entry in self.index))
+        self.file.write(TRAILER.pack(offset, TRAILER_MAGIC))
+        self.file.close()
+
+
+class SegmentReader:
+    """
+    Reads a segment file through a read-only memory map, so that seeking
+    only touches the pages holding the keyframe index and the records
+    being replayed.
+
+    :param path: Segment file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a recording")
+        self.index, self.end = self.load_index()
+
+    def header(self, offset: int) -> tuple[int, float, int] | None:
+        if offset + HEADER.size > len(self.map):
+            return None
+        kind, timestamp, length = HEADER.unpack_from(self.map, offset)
+        if offset + HEADER.size + length > len(self.map):
+            # a record cut short by a crash
+            return None
+        return kind, timestamp, length
+
+    def load_index(self) -> tuple[list[tuple[float, int]], float | None]:
+        if len(self.map) >= len(MAGIC) + TRAILER.size:
+            offset, magic = TRAILER.unpack_from(self.map, len(self.map) - TRAILER.size)
+            header = self.header(offset) if magic == TRAILER_MAGIC else None
+            if header and header[0] == INDEX:
+                start = offset + HEADER.size
+                entries = [INDEX_ENTRY.unpack_from(self.map, start + i) for i in range(0, header[2], INDEX_ENTRY.size)]
+                return entries, header[1]
+
+        # not closed cleanly: walk the headers, skipping over the payloads
+        entries = []
+        end = None
+        for kind, timestamp, offset, _ in self.records(len(MAGIC), headers_only=True):
+            if kind == KEYFRAME:
+                entries.append((timestamp, offset))
+            end = timestamp
+        return entries, end
+
+    @property
+    def start(self) -> float | None:
+        return self.index[0][0] if self.index else None
+
+    def records(self, offset: int, headers_only: bool = False):
+        while True:
+            header = self.header(offset)
+            if header is None:
+                return
+            kind, timestamp, length = header
+            if kind == INDEX:
+                return
+            payload = None if headers_only else self.map[offset + HEADER.size:offset + HEADER.size + length]
+            yield kind, timestamp, offset, payload
+            offset += HEADER.size + length
+
+    def seek(self, timestamp: float) -> int:
+        """
+        Returns the offset of the last keyframe at or before timestamp, or
+        of the first one if there is none.
+        """
+        i = bisect.bisect_right([entry[0] for entry in self.index], timestamp)
+        return self.index[max(0, i - 1)][1]
+
+    def close(self) -> None:
+        self.map.close()
+
+
+def decode_keyframe(payload: bytes) -> tuple[int, int, bytes]:
+    cols, rows = DIMENSIONS.unpack_from(payload)
+    return cols, rows, zlib.decompress(payload[DIMENSIONS.size:])
+
+
+def decode_output(timestamp: float, payload: bytes):
+    data = zlib.decompress(payload)
+    offset = 0
+    while offset < len(data):
+        delta, length = MESSAGE.unpack_from(data, offset)
+        offset += MESSAGE.size
+        yield timestamp + delta, data[offset:offset + length]
+        offset += length
+
+
+class SessionRecorder:
+    """
+    Records one terminal session, mirroring its output into a TerminalScreen
+    to write a keyframe every keyframe_interval seconds. Output is written
+    in chunks of up to chunk_seconds, and a new segment is started once the
+    current one reaches segment_bytes.
+
+    :param store: Store holding the recording.
+    :param session: Recording name.
+    """
+
+    def __init__(self, store: 'RecordingStore', session: str) -> None:
+        self.store = store
+        self.session = session
+        self.screen = TerminalScreen()
+        self.sequence = 0
+        self.writer = None
+        self.keyframed = 0.0
+        self.closed = False
+
+    def open_segment(self, timestamp: float) -> None:
+        path = os.path.join(self.store.root, segment_name(self.session, self.sequence))
+        self.sequence += 1
+        self.writer = SegmentWriter(path)
+        self.store.active.add(path)
+        self.keyframe(timestamp)
+
+    def close_segment(self) -> None:
+        self.writer.close()
+        self.store.active.discard(self.writer.path)
+        self.writer = None
+        self.store.enforce_retention()
+
+    def keyframe(self, timestamp: float) -> None:
+        self.writer.keyframe(timestamp, self.screen.cols, self.screen.rows, self.screen.snapshot())
+        self.keyframed = timestamp
+
+    def output(self, data: bytes) -> None:
+        timestamp = time.time()
+        if self.writer is None:
+            self.open_segment(timestamp)
+        elif self.writer.size >= self.store.segment_bytes:
+            self.close_segment()
+            self.open_segment(timestamp)
+        elif timestamp - self.keyframed >= self.store.keyframe_interval:
+            self.keyframe(timestamp)
+
+        self.screen.feed(data)
+        self.writer.output(timestamp, data)
+        if timestamp - self.writer.chunk_start >= self.store.chunk_seconds or self.writer.chunk_bytes >= self.store.chunk_bytes:
+            self.writer.flush()
+
+    async def record(self, stream: AsyncGenerator[Any, None]) -> AsyncGenerator[Any, None]:
+        try:
+            async for message in stream:
+                try:
+                    self.output(to_bytes(message))
+                except OSError:
+                    # a full disk must not interrupt the viewer
+                    import traceback
+                    traceback.print_exc()
+                yield message
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.writer is not None:
+                self.close_segment()
+            elif self.sequence == 0:
+                # nothing was recorded, drop the reserved name
+                os.remove(os.path.join(self.store.root, segment_name(self.session, 0)))
+        except OSError:
+            import traceback
+            traceback.print_exc()
+
+
+class RecordingStore:
+    """
+    Directory of session recordings with a total size cap. Once the cap is
+    exceeded, the oldest segments not being written are deleted.
+
+    :param root: Directory holding the segment files.
+    :param max_bytes: Size cap of all recordings.
+    :param keyframe_interval: Seconds between keyframes.
+    :param chunk_seconds: Maximum seconds of output per compressed chunk.
+    :param chunk_bytes: Maximum bytes of output per compressed chunk.
+    """
+
+    def __init__(self, root: str, max_bytes: int, keyframe_interval: float = 30, chunk_seconds: float = 2,
+                 chunk_bytes: int = 256 * 1024) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        self.chunk_seconds = chunk_seconds
+        self.chunk_bytes = chunk_bytes
+        # small enough that retention frees space in steps, large enough to
+        # keep the number of files down
+        self.segment_bytes = min(64 * 1024 * 1024, max(1024 * 1024, max_bytes // 8))
+        self.active = set()
+        os.makedirs(root, exist_ok=True)
+
+    def start(self) -> SessionRecorder:
+        session = f"{int(time.time() * 1000)}"
+        while os.path.exists(os.path.join(self.root, segment_name(session, 0))):
+            session = str(int(session) + 1)
+        # reserve the name before the first output arrives
+        open(os.path.join(self.root, segment_name(session, 0)), 'wb').close()
+        return SessionRecorder(self, session)
+
+    def segments(self) -> dict[str, list[str]]:
+        """
+        Maps recording names to their segment paths, in order.
+        """
+        sessions = {}
+        for name in sorted(os.listdir(self.root)):
+            parsed = parse_segment_name(name)
+            if parsed:
+                sessions.setdefault(parsed[0], []).append(os.path.join(self.root, name))
+        return sessions
+
+    def enforce_retention(self) -> list[str]:
+        files = []
+        for name in os.listdir(self.root):
+            parsed = parse_segment_name(name)
+            if parsed:
+                path = os.path.join(self.root, name)
+                files.append((int(parsed[0]) if parsed[0].isdigit() else 0, parsed[1], path, os.path.getsize(path)))
+        files.sort()
+
+        total = sum(file[3] for file in files)
+        removed = []
+        for _, _, path, size in files:
+            if total <= self.max_bytes:
+                break
+            if path in self.active:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                removed.append(path)
+            except OSError:
+                pass
+        return removed
+
+    def list(self) -> list[dict]:
+        recordings = []
+        for session, paths in self.segments().items():
+            # only the first and last segments are read, for the start and
+            # end times
+            start = end = None
+            for path in dict.fromkeys([paths[0], paths[-1]]):
+                try:
+                    reader = SegmentReader(path)
+                except (ValueError, OSError):
+                    continue
+                start = reader.start if start is None else start
+                end = reader.end
+                reader.close()
+            if start is None:
+                continue
+            size = sum(os.path.getsize(path) for path in paths)
+            recordings.append({
+                "name": session,
+                "start": start,
+                "end": end,
+                "bytes": size,
+                "active": any(path in self.active for path in paths),
+            })
+        return recordings
+
+    async def replay(self, session: str, offset: float = 0, speed: float = 1.0, max_gap: float = 5.0) -> AsyncGenerator[bytes, None]:
+        """
+        Replays a recording starting offset seconds in. The screen at that
+        point is rebuilt from the closest keyframe before it, after which
+        output follows at the recorded pace, scaled by speed. Idle periods
+        longer than max_gap seconds are shortened to max_gap.
+        """
+        readers = []
+        for path in self.segments().get(session, []):
+            try:
+                reader = SegmentReader(path)
+            except (ValueError, OSError):
+                continue
+            if reader.start is None:
+                reader.close()
+                continue
+            readers.append(reader)
+        if not readers:
+            raise KeyError(f"No recording named {session}")
+
+        try:
+            target = readers[0].start + max(0, offset)
+            # the last segment starting at or before the target
+            first = max([i for i, reader in enumerate(readers) if reader.start <= target] or [0])
+            loop = asyncio.get_running_loop()
+            started = None
+            elapsed = 0.0
+            previous = None
+            backlog = []
+            for i, reader in enumerate(readers[first:]):
+                position = reader.seek(target) if i == 0 else len(MAGIC)
+                for kind, timestamp, _, payload in reader.records(position):
+                    if kind == KEYFRAME:
+                        if i == 0 and timestamp <= target:
+                            backlog = [decode_keyframe(payload)[2]]
+                        continue
+                    for message_timestamp, data in decode_output(timestamp, payload):
+                        if message_timestamp < target:
+                            # fast-forward from the keyframe to the target
+                            backlog.append(data)
+                            continue
+                        if backlog:
+                            yield b''.join(backlog)
+                            backlog = []
+                        # pace against the clock rather than sleeping between
+                        # every message, as terminal output comes in bursts of
+                        # small writes
+                        if previous is not None:
+                            elapsed += min(message_timestamp - previous, max_gap) / speed
+                            delay = started + elapsed - loop.time()
+                            if delay > 0.01:
+                                await asyncio.sleep(delay)
+                        else:
+                            started = loop.time()
+                        previous = message_timestamp
+                        yield data
+            if backlog:
+                yield b''.join(backlog)
+        finally:
+            for reader in readers:
+                reader.close()
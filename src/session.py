@@ -0,0 +1,229 @@
+import asyncio
+import json
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+from terminal import TerminalScreen
+
+
+def parse_control(message: Any) -> dict | None:
+    """
+    Returns the parsed control message (such as a resize) sent by a terminal
+    viewer, or None if the message is terminal input.
+    """
+    if isinstance(message, (bytes, bytearray)):
+        return None
+    try:
+        parsed = json.loads(message)
+    except (TypeError, ValueError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def resize_dimensions(control: dict | None) -> tuple[int, int] | None:
+    """
+    Returns the columns and rows of a resize control message, or None if
+    control is not a valid resize.
+    """
+    if control is None or not isinstance(control.get('dim'), dict):
+        return None
+    try:
+        return int(control['dim']['cols']), int(control['dim']['rows'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def follow_resizes(input: AsyncGenerator[Any, None], screen: TerminalScreen) -> AsyncGenerator[Any, None]:
+    """
+    Passes terminal input through, resizing screen along with the viewer's
+    terminal.
+    """
+    async for message in input:
+        dimensions = resize_dimensions(parse_control(message))
+        if dimensions is not None:
+            screen.resize(*dimensions)
+        yield message
+
+
+def to_bytes(message: Any) -> bytes:
+    if isinstance(message, str):
+        return message.encode()
+    return bytes(message)
+
+
+async def queue_input(queue: asyncio.Queue) -> AsyncGenerator[Any, None]:
+    """
+    Yields terminal input put on queue, until None is put.
+    """
+    while True:
+        message = await queue.get()
+        if message is None:
+            return
+        yield message
+
+
+class Viewer:
+    def __init__(self, session: 'SharedSession', queue_size: int) -> None:
+        self.session = session
+        self.queue = asyncio.Queue(queue_size)
+        self.resync = False
+        self.input_task = None
+        self.order = 0
+
+    def send(self, data: bytes | None) -> None:
+        if data is not None and self.resync:
+            return
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # the viewer fell behind: drop its backlog and resynchronize it
+            # from a snapshot once it catches up
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            if data is None:
+                self.queue.put_nowait(None)
+            else:
+                self.resync = True
+                self.session.resyncs += 1
+
+    async def stream(self) -> AsyncGenerator[bytes, None]:
+        try:
+            while True:
+                if self.resync and self.queue.empty():
+                    self.resync = False
+                    yield self.session.screen.snapshot()
+                    continue
+                data = await self.queue.get()
+                if data is None:
+                    return
+                yield data
+        finally:
+            self.session.detach(self)
+
+
+class SharedSession:
+    """
+    A single terminal stream broadcast to any number of viewers.
+
+    Output is mirrored into a TerminalScreen so that viewers joining late
+    start from a full-screen snapshot. Every viewer has a bounded queue; one
+    that falls behind has its backlog replaced by a snapshot instead of
+    slowing down the others. The stream is closed once the last viewer has
+    been gone for the grace period.
+
+    Only the viewer that has been attached the longest controls the
+    process: keystrokes from the others are dropped, so that one viewer
+    cannot quit or reconfigure cosmotop for everyone. Resizes are
+    forwarded from every viewer.
+
+    :param open_stream: Opens the underlying terminal stream given an input generator.
+    :param grace: Seconds to keep the stream running without viewers.
+    :param queue_size: Number of pending messages per viewer before it is resynchronized.
+    :param on_close: Called once the session has closed.
+    """
+
+    def __init__(self, open_stream: Callable[[AsyncGenerator[Any, None]], Awaitable[AsyncGenerator[Any, None]]],
+                 grace: float = 30, queue_size: int = 256, on_close: Callable[[], None] = None) -> None:
+        self.open_stream = open_stream
+        self.grace = grace
+        self.queue_size = queue_size
+        self.on_close = on_close
+        self.screen = TerminalScreen()
+        self.viewers: set[Viewer] = set()
+        self.controller = None
+        self.attached = 0
+        self.input = asyncio.Queue()
+        self.started = None
+        self.reader = None
+        self.shutdown_task = None
+        self.closed = False
+        self.resyncs = 0
+
+    async def start(self) -> None:
+        stream = await self.open_stream(queue_input(self.input))
+        self.reader = asyncio.create_task(self.read_loop(stream))
+
+    async def read_loop(self, stream: AsyncGenerator[Any, None]) -> None:
+        try:
+            async for message in stream:
+                data = to_bytes(message)
+                self.screen.feed(data)
+                for viewer in list(self.viewers):
+                    viewer.send(data)
+        except asyncio.CancelledError:
+            pass
+        except:
+            import traceback
+            traceback.print_exc()
+        finally:
+            self.close()
+
+    async def attach(self, input: AsyncGenerator[Any, None]) -> AsyncGenerator[bytes, None]:
+        if self.started is None:
+            self.started = asyncio.ensure_future(self.start())
+        await self.started
+
+        if self.shutdown_task:
+            self.shutdown_task.cancel()
+            self.shutdown_task = None
+
+        viewer = Viewer(self, self.queue_size)
+        self.attached += 1
+        viewer.order = self.attached
+        viewer.send(self.screen.snapshot())
+        self.viewers.add(viewer)
+        if self.controller is None:
+            self.controller = viewer
+        viewer.input_task = asyncio.create_task(self.forward_input(viewer, input))
+        return viewer.stream()
+
+    async def forward_input(self, viewer: Viewer, input: AsyncGenerator[Any, None]) -> None:
+        try:
+            async for message in input:
+                if message is None:
+                    break
+                control = parse_control(message)
+                dimensions = resize_dimensions(control)
+                if dimensions is not None:
+                    # the pty has a single size, the most recent resize wins
+                    self.screen.resize(*dimensions)
+                elif control is not None and 'eof' in control:
+                    # one viewer leaving must not end the shared process
+                    break
+                elif viewer is not self.controller:
+                    continue
+                self.input.put_nowait(message)
+        except asyncio.CancelledError:
+            pass
+        except:
+            import traceback
+            traceback.print_exc()
+        viewer.send(None)
+
+    def detach(self, viewer: Viewer) -> None:
+        if viewer not in self.viewers:
+            return
+        self.viewers.discard(viewer)
+        if viewer is self.controller:
+            # hand control to the viewer that has been attached the longest
+            self.controller = min(self.viewers, key=lambda other: other.order, default=None)
+        if viewer.input_task:
+            viewer.input_task.cancel()
+        if not self.viewers and not self.closed and not self.shutdown_task:
+            self.shutdown_task = asyncio.create_task(self.shutdown_after_grace())
+
+    async def shutdown_after_grace(self) -> None:
+        await asyncio.sleep(self.grace)
+        if not self.viewers:
+            self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.input.put_nowait(None)
+        if self.reader and self.reader is not asyncio.current_task():
+            self.reader.cancel()
+        for viewer in list(self.viewers):
+            viewer.send(None)
+        if self.on_close:
+            self.on_close()
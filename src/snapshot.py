@@ -0,0 +1,309 @@
+import asyncio
+import io
+import json
+import math
+import os
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+from PIL import Image, ImageDraw, ImageFont
+
+from session import queue_input, to_bytes
+from terminal import TerminalScreen
+
+
+# monospace fonts covering the box drawing and braille characters cosmotop
+# draws its graphs with, tried in order before falling back to Pillow's own
+FONT_PATHS = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf',
+    '/usr/share/fonts/TTF/DejaVuSansMono.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSansMono.ttf',
+    '/System/Library/Fonts/Menlo.ttc',
+    'C:\\Windows\\Fonts\\consola.ttf',
+]
+
+# xterm's palette for the named colors pyte reports
+PALETTE = {
+    'black': (0, 0, 0),
+    'red': (205, 0, 0),
+    'green': (0, 205, 0),
+    'brown': (205, 205, 0),
+    'blue': (0, 0, 238),
+    'magenta': (205, 0, 205),
+    'cyan': (0, 205, 205),
+    'white': (229, 229, 229),
+    'brightblack': (127, 127, 127),
+    'brightred': (255, 0, 0),
+    'brightgreen': (0, 255, 0),
+    'brightbrown': (255, 255, 0),
+    'brightblue': (92, 92, 255),
+    'brightmagenta': (255, 0, 255),
+    'brightcyan': (0, 255, 255),
+    'brightwhite': (255, 255, 255),
+}
+DEFAULT_FG = PALETTE['white']
+DEFAULT_BG = PALETTE['black']
+
+# seconds after starting the terminal before its first frame is rendered
+FIRST_FRAME_DELAY = 0.5
+
+MIME_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+
+def load_font(size: int) -> ImageFont.ImageFont | ImageFont.FreeTypeFont:
+    for path in FONT_PATHS:
+        if os.path.exists(path):
+            try:
+                return ImageFont.truetype(path, size)
+            except OSError:
+                pass
+    return ImageFont.load_default(size)
+
+
+def to_rgb(color: str, bold: bool, default: tuple[int, int, int]) -> tuple[int, int, int]:
+    if color == 'default':
+        return default
+    if bold and color in PALETTE and not color.startswith('bright'):
+        # like xterm, bold text in one of the first 8 colors is drawn bright
+        color = 'bright' + color
+    if color in PALETTE:
+        return PALETTE[color]
+    try:
+        # pyte stores 256-color and truecolor values as hex
+        return (int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16))
+    except ValueError:
+        return default
+
+
+def encode(image: Image.Image, format: str, quality: int = 80) -> bytes:
+    out = io.BytesIO()
+    if format == 'png':
+        image.save(out, 'PNG', compress_level=3)
+    else:
+        image.save(out, 'JPEG', quality=quality)
+    return out.getvalue()
+
+
+class ScreenRenderer:
+    """
+    Draws a TerminalScreen into an image, one character per cell. The image
+    is kept between renders and only the lines pyte marked as dirty since
+    the previous render are drawn again.
+
+    Glyphs are rasterized once into masks and then stamped into their cells
+    in the character's color, which is several times faster than laying out
+    text with the font on every frame.
+
+    :param font_size: Font size in pixels.
+    """
+
+    def __init__(self, font_size: int = 14) -> None:
+        self.font = load_font(font_size)
+        ascent, descent = self.font.getmetrics()
+        self.cell_width = max(1, round(self.font.getlength('M')))
+        self.cell_height = ascent + descent
+        self.glyphs = {}
+        self.image = None
+
+    def size(self, cols: int, rows: int) -> tuple[int, int]:
+        return cols * self.cell_width, rows * self.cell_height
+
+    def glyph(self, char: str) -> Image.Image:
+        mask = self.glyphs.get(char)
+        if mask is None:
+            width = max(self.cell_width, math.ceil(self.font.getlength(char)))
+            mask = Image.new('L', (width, self.cell_height))
+            ImageDraw.Draw(mask).text((0, 0), char, fill=255, font=self.font)
+            self.glyphs[char] = mask
+        return mask
+
+    def render(self, terminal: TerminalScreen) -> Image.Image:
+        screen = terminal.screen
+        size = self.size(screen.columns, screen.lines)
+        if self.image is None or self.image.size != size:
+            self.image = Image.new('RGB', size, DEFAULT_BG)
+            dirty = range(screen.lines)
+        else:
+            dirty = sorted(y for y in screen.dirty if y < screen.lines)
+        screen.dirty.clear()
+
+        for y in dirty:
+            self.draw_line(screen.buffer[y], y, screen.columns)
+        return self.image
+
+    def draw_line(self, line: Any, y: int, columns: int) -> None:
+        image = self.image
+        width = self.cell_width
+        top = y * self.cell_height
+        bottom = top + self.cell_height
+        image.paste(DEFAULT_BG, (0, top, columns * width, bottom))
+
+        # backgrounds are filled in runs of the same color before the
+        # glyphs are drawn over them
+        glyphs = []
+        run_start = 0
+        run_bg = DEFAULT_BG
+        for x in range(columns):
+            char = line[x]
+            if not char.data:
+                # trailing half of a wide character
+                continue
+            fg = to_rgb(char.fg, char.bold, DEFAULT_FG)
+            bg = to_rgb(char.bg, False, DEFAULT_BG)
+            if char.reverse:
+                fg, bg = bg, fg
+            if bg != run_bg:
+                if run_bg != DEFAULT_BG:
+                    image.paste(run_bg, (run_start * width, top, x * width, bottom))
+                run_start = x
+                run_bg = bg
+            if not char.data.isspace():
+                glyphs.append((x, char.data, fg))
+        if run_bg != DEFAULT_BG:
+            image.paste(run_bg, (run_start * width, top, columns * width, bottom))
+
+        for x, data, fg in glyphs:
+            image.paste(fg, (x * width, top), self.glyph(data))
+
+
+class TerminalSnapshots:
+    """
+    Keeps a terminal running headless, mirrored into a TerminalScreen, and
+    renders it to still images on request.
+
+    The terminal is started by the first request and closed once no image
+    has been requested for the idle period. A new image is only rendered if
+    the screen changed since the last one and at most fps times per second;
+    any other request is answered with the last image.
+
+    :param open_stream: Opens the terminal stream given an input generator.
+    :param cols: Terminal width in characters.
+    :param rows: Terminal height in characters.
+    :param fps: Maximum number of images rendered per second.
+    :param format: Image format, jpeg or png.
+    :param idle: Seconds without requests before the terminal is closed.
+    :param font_size: Font size in pixels.
+    """
+
+    def __init__(self, open_stream: Callable[[AsyncGenerator[Any, None]], Awaitable[AsyncGenerator[Any, None]]],
+                 cols: int = 160, rows: int = 48, fps: float = 1.0, format: str = 'jpeg',
+                 idle: float = 60, font_size: int = 14) -> None:
+        self.open_stream = open_stream
+        self.cols = cols
+        self.rows = rows
+        self.fps = max(0.01, fps)
+        self.format = format if format in MIME_TYPES else 'jpeg'
+        self.idle = idle
+        self.renderer = ScreenRenderer(font_size)
+        self.lock = asyncio.Lock()
+        self.screen = None
+        self.input = None
+        self.started = None
+        self.reader = None
+        self.idle_task = None
+        self.output = None
+        self.frame = None
+        self.frame_revision = None
+        self.started_at = 0.0
+        self.rendered_at = 0.0
+        self.requested = 0.0
+        self.rendered = 0
+        self.skipped = 0
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+    def picture_size(self) -> tuple[int, int]:
+        return self.renderer.size(self.cols, self.rows)
+
+    async def start(self) -> None:
+        self.started_at = time.monotonic()
+        self.screen = TerminalScreen(self.cols, self.rows)
+        self.renderer.image = None
+        self.frame = None
+        self.frame_revision = None
+        self.output = asyncio.Event()
+        self.input = asyncio.Queue()
+        self.input.put_nowait(json.dumps({'dim': {'cols': self.cols, 'rows': self.rows}}))
+        stream = await self.open_stream(queue_input(self.input))
+        self.reader = asyncio.create_task(self.read_loop(stream))
+        self.idle_task = asyncio.create_task(self.idle_loop())
+
+    async def read_loop(self, stream: AsyncGenerator[Any, None]) -> None:
+        try:
+            async for message in stream:
+                self.screen.feed(to_bytes(message))
+                self.output.set()
+        except asyncio.CancelledError:
+            pass
+        except:
+            import traceback
+            traceback.print_exc()
+        finally:
+            self.close()
+
+    async def idle_loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.idle - (time.monotonic() - self.requested)))
+            if time.monotonic() - self.requested >= self.idle:
+                self.close()
+                return
+
+    async def picture(self, first_output_timeout: float = 5.0) -> bytes:
+        """
+        Returns the current screen as an encoded image.
+        """
+        self.requested = time.monotonic()
+        if self.started is None:
+            self.started = asyncio.ensure_future(self.start())
+        started = self.started
+        try:
+            await started
+        except:
+            if self.started is started:
+                self.started = None
+            raise
+
+        if self.frame is None:
+            # cosmotop draws its first screen in bursts shortly after starting
+            try:
+                await asyncio.wait_for(self.output.wait(), first_output_timeout)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(self.started_at + FIRST_FRAME_DELAY - time.monotonic())
+
+        async with self.lock:
+            now = time.monotonic()
+            if self.frame is not None and (self.screen.revision == self.frame_revision or now - self.rendered_at < 1 / self.fps):
+                self.skipped += 1
+                return self.frame
+
+            # drawing reads the screen, which is only updated on this thread,
+            # while encoding a copy can run alongside it
+            self.frame_revision = self.screen.revision
+            image = self.renderer.render(self.screen).copy()
+            self.frame = await asyncio.to_thread(encode, image, self.format)
+            self.rendered_at = now
+            self.rendered += 1
+            return self.frame
+
+    def summary(self) -> str:
+        state = "running" if self.started is not None else "stopped"
+        return f"{state}, {self.rendered} rendered, {self.skipped} unchanged or rate limited"
+
+    def close(self) -> None:
+        if self.started is None:
+            return
+        self.started = None
+        if self.input is not None:
+            self.input.put_nowait(json.dumps({'eof': True}))
+            self.input.put_nowait(None)
+        for task in (self.reader, self.idle_task):
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+        self.reader = None
+        self.idle_task = None
@@ -0,0 +1,113 @@
+import os
+import shutil
+
+
+class InstallStore:
+    """
+    Side-by-side install layout for versioned binaries.
+
+    Each version lives in its own directory under root/versions. The active
+    version is recorded in a pointer file and, where symlinks are available,
+    a root/current symlink, both of which are swapped atomically. Anything
+    else under root (downloaded themes, caches) is left alone.
+
+    :param root: Directory that holds the store.
+    :param pointer: Path of the file recording the active version.
+    :param retain: Number of most recently activated versions to keep on disk,
+        including the active one.
+    """
+
+    def __init__(self, root: str, pointer: str, retain: int = 2) -> None:
+        self.root = root
+        self.pointer = pointer
+        self.retain = retain
+        self.versions_path = os.path.join(root, 'versions')
+        self.current_path = os.path.join(root, 'current')
+        self.sessions: dict[str, int] = {}
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.versions_path, version)
+
+    def active(self) -> str | None:
+        try:
+            with open(self.pointer) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def activate(self, version: str) -> None:
+        version_dir = self.version_dir(version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        # directory mtimes record activation order for garbage collection
+        os.utime(version_dir)
+
+        tmp = self.pointer + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(version)
+        os.replace(tmp, self.pointer)
+
+        try:
+            tmp = self.current_path + '.tmp'
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            os.symlink(os.path.join('versions', version), tmp, target_is_directory=True)
+            os.replace(tmp, self.current_path)
+        except (OSError, NotImplementedError):
+            # symlinks may be unavailable, e.g. on Windows without developer mode
+            pass
+
+    def current_dir(self) -> str | None:
+        if os.path.isdir(self.current_path):
+            return self.current_path
+        version = self.active()
+        return self.version_dir(version) if version else None
+
+    def migrate_legacy(self, filenames: list[str]) -> None:
+        """
+        Moves binaries from the old flat layout, where they lived directly in
+        root next to the pointer file, into the directory of the version the
+        pointer names.
+        """
+        version = self.active()
+        if not version:
+            return
+        for filename in filenames:
+            legacy = os.path.join(self.root, filename)
+            if os.path.isfile(legacy):
+                os.makedirs(self.version_dir(version), exist_ok=True)
+                os.replace(legacy, os.path.join(self.version_dir(version), filename))
+
+    def acquire(self, version: str) -> None:
+        self.sessions[version] = self.sessions.get(version, 0) + 1
+
+    def release(self, version: str) -> None:
+        count = self.sessions.get(version, 0) - 1
+        if count > 0:
+            self.sessions[version] = count
+        else:
+            self.sessions.pop(version, None)
+
+    def gc(self) -> list[str]:
+        """
+        Removes versions that are neither active, among the most recently
+        activated, nor used by a running session. Returns the removed versions.
+        """
+        if not os.path.isdir(self.versions_path):
+            return []
+
+        active = self.active()
+        versions = sorted(
+            os.listdir(self.versions_path),
+            key=lambda v: os.path.getmtime(self.version_dir(v)),
+            reverse=True,
+        )
+        keep = set(versions[:self.retain])
+
+        removed = []
+        for version in versions:
+            if version == active or version in keep or version in self.sessions:
+                continue
+            shutil.rmtree(self.version_dir(version), ignore_errors=True)
+            removed.append(version)
+        return removed
@@ -0,0 +1,96 @@
+import pyte
+import pyte.graphics
+
+
+FG_CODES = {name: code for code, name in {**pyte.graphics.FG_ANSI, **pyte.graphics.FG_AIXTERM}.items()}
+BG_CODES = {name: code for code, name in {**pyte.graphics.BG_ANSI, **pyte.graphics.BG_AIXTERM}.items()}
+
+
+def sgr(char: pyte.screens.Char) -> str:
+    codes = ['0']
+    if char.bold:
+        codes.append('1')
+    if char.italics:
+        codes.append('3')
+    if char.underscore:
+        codes.append('4')
+    if char.blink:
+        codes.append('5')
+    if char.reverse:
+        codes.append('7')
+    if char.strikethrough:
+        codes.append('9')
+    for color, names, truecolor in ((char.fg, FG_CODES, '38'), (char.bg, BG_CODES, '48')):
+        if color in names:
+            if color != 'default':
+                codes.append(str(names[color]))
+        else:
+            # pyte stores 256-color and truecolor values as hex
+            codes.append(f"{truecolor};2;{int(color[0:2], 16)};{int(color[2:4], 16)};{int(color[4:6], 16)}")
+    return f"\x1b[{';'.join(codes)}m"
+
+
+class TerminalScreen:
+    """
+    In-memory terminal screen model fed with raw terminal output.
+
+    :param cols: Initial number of columns.
+    :param rows: Initial number of rows.
+    """
+
+    def __init__(self, cols: int = 80, rows: int = 24) -> None:
+        self.screen = pyte.Screen(cols, rows)
+        self.stream = pyte.ByteStream(self.screen)
+        self.revision = 0
+
+    @property
+    def cols(self) -> int:
+        return self.screen.columns
+
+    @property
+    def rows(self) -> int:
+        return self.screen.lines
+
+    def feed(self, data: bytes) -> None:
+        self.stream.feed(data)
+        self.revision += 1
+
+    def resize(self, cols: int, rows: int) -> None:
+        if cols != self.screen.columns or rows != self.screen.lines:
+            self.screen.resize(rows, cols)
+            self.revision += 1
+
+    def snapshot(self) -> bytes:
+        """
+        Renders the current screen as escape sequences that reproduce it on a
+        freshly reset terminal of the same size.
+        """
+        screen = self.screen
+        out = ['\x1bc']
+
+        # private modes such as the alternate screen and mouse tracking;
+        # pyte stores them shifted left by 5 bits
+        for mode in sorted(screen.mode):
+            if mode >= 32 and mode % 32 == 0 and mode >> 5 != 25:
+                out.append(f"\x1b[?{mode >> 5}h")
+
+        for y in range(screen.lines):
+            out.append(f"\x1b[{y + 1};1H")
+            line = screen.buffer[y]
+            attrs = None
+            for x in range(screen.columns):
+                char = line[x]
+                if not char.data:
+                    # trailing half of a wide character
+                    continue
+                char_attrs = sgr(char)
+                if char_attrs != attrs:
+                    out.append(char_attrs)
+                    attrs = char_attrs
+                out.append(char.data)
+
+        cursor = screen.cursor
+        out.append(sgr(cursor.attrs))
+        out.append(f"\x1b[{cursor.y + 1};{cursor.x + 1}H")
+        out.append('\x1b[?25l' if cursor.hidden else '\x1b[?25h')
+        return ''.join(out).encode()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import shutil
+
+import download
+
+
+class ThemeCache:
+    """
+    Content-addressed cache of downloaded theme files.
+
+    Files are stored under their SHA-256, so identical themes are kept once
+    and two URLs with the same file name never collide. The index maps each
+    URL to the hash of its last download, the validators used to revalidate
+    it, and the file it was installed as.
+
+    :param root: Directory holding the index and the cached files.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.objects = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, 'index.json')
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.index = {}
+
+    def save(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.objects, sha256)
+
+    async def fetch(self, url: str) -> tuple[str, bool]:
+        """
+        Downloads url into the cache, revalidating an earlier download with
+        its ETag and Last-Modified. Returns the hash of the cached file and
+        whether it changed.
+        """
+        entry = self.index.get(url)
+        cached = entry is not None and os.path.isfile(self.path(entry['sha256']))
+
+        # one download file per URL, so concurrent fetches never share it
+        dest = os.path.join(self.objects, hashlib.sha1(url.encode()).hexdigest() + '.download')
+        result = await download.fetch(
+            url,
+            dest,
+            etag=entry.get('etag') if cached else None,
+            last_modified=entry.get('last_modified') if cached else None,
+        )
+        if result is None:
+            return entry['sha256'], False
+
+        target = self.path(result['sha256'])
+        if os.path.isfile(target):
+            os.remove(dest)
+        else:
+            os.replace(dest, target)
+
+        self.index[url] = {
+            **(entry or {}),
+            'sha256': result['sha256'],
+            'etag': result['etag'],
+            'last_modified': result['last_modified'],
+        }
+        self.save()
+        return result['sha256'], not cached or entry['sha256'] != result['sha256']
+
+    def install(self, url: str, target: str) -> bool:
+        """
+        Installs the cached download of url as target, by hardlink where
+        possible, and atomically replacing any existing file. Returns False
+        if target already had the same contents.
+        """
+        sha256 = self.index[url]['sha256']
+        if self.index[url].get('installed') != target:
+            self.index[url]['installed'] = target
+            self.save()
+        if os.path.isfile(target) and download.sha256_file(target) == sha256:
+            return False
+
+        tmp = target + '.tmp'
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(self.path(sha256), tmp)
+        except OSError:
+            shutil.copyfile(self.path(sha256), tmp)
+        os.replace(tmp, target)
+        return True
+
+    def prune(self, urls: list[str]) -> list[str]:
+        """
+        Forgets URLs no longer in urls and deletes cached files nothing
+        refers to. Files installed from forgotten URLs are removed too,
+        unless they were modified since. Returns the removed installs.
+        """
+        removed = []
+        forgotten = [self.index.pop(url) for url in list(self.index) if url not in urls]
+        installed = {entry.get('installed') for entry in self.index.values()}
+        for entry in forgotten:
+            target = entry.get('installed')
+            if target in installed:
+                continue
+            if target and os.path.isfile(target) and download.sha256_file(target) == entry['sha256']:
+                os.remove(target)
+                removed.append(target)
+
+        referenced = {entry['sha256'] for entry in self.index.values()}
+        try:
+            names = os.listdir(self.objects)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if name not in referenced and not name.endswith(('.download', '.tmp')):
+                os.remove(os.path.join(self.objects, name))
+
+        self.save()
+        return removed